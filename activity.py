@@ -0,0 +1,122 @@
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from models import DailyActivity, db
+
+METRICS = ('posts', 'likes_received', 'comments', 'messages')
+GRANULARITIES = ('day', 'week', 'month')
+ACTIVITY_DEFAULT_DAYS = 30
+MAX_ACTIVITY_BUCKETS = 1000
+
+
+class InvalidActivityRange(ValueError):
+    pass
+
+
+def record_activity(user_id, metric, when=None, delta=1):
+    """Add delta to the user's counter for metric on the day of `when` (default: today, UTC).
+
+    user_id may be a scalar subquery, e.g. a post's author. One upsert;
+    callers commit, so the counter lands in the same transaction as the write.
+    """
+    when = when or datetime.utcnow()
+    day = when.date() if isinstance(when, datetime) else when
+    column = getattr(DailyActivity, metric)
+    stmt = insert(DailyActivity).values(user_id=user_id, day=day, **{metric: delta})
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyActivity.user_id, DailyActivity.day],
+        set_={metric: column + stmt.excluded[metric]}
+    )
+    db.session.execute(stmt)
+
+
+def retract_activity(metric, rows):
+    """Take back what record_activity counted for deleted rows, given as (user_id, timestamp) pairs.
+
+    Each day loses what its rows added, so past buckets stay true to the
+    rows that still exist. Rows without a timestamp predate the rollup and
+    were never counted. One upsert per user and day; callers commit.
+    """
+    counts = Counter((user_id, when.date()) for user_id, when in rows if when is not None)
+    for (user_id, day), count in counts.items():
+        record_activity(user_id, metric, day, -count)
+
+
+def drop_activity(user_id):
+    """Remove the user's rollup rows, e.g. before deleting the account. Callers commit."""
+    DailyActivity.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+
+
+def bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(start, granularity):
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _bucket_expression(granularity):
+    # Same buckets as bucket_start(), computed by SQLite: weeks start on Monday
+    if granularity == 'week':
+        return func.date(DailyActivity.day, 'weekday 0', '-6 days')
+    if granularity == 'month':
+        return func.strftime('%Y-%m-01', DailyActivity.day)
+    return func.date(DailyActivity.day)
+
+
+def get_activity(user_id, start=None, end=None, granularity='day'):
+    """Return {'labels': [...], metric: [...] for each metric} over [start, end].
+
+    One GROUP BY over the rollup sums every metric per bucket, whatever the
+    range; empty buckets come back as zeros.
+    """
+    if granularity not in GRANULARITIES:
+        raise InvalidActivityRange(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=ACTIVITY_DEFAULT_DAYS)
+    if start > end:
+        raise InvalidActivityRange('start must not be after end')
+
+    labels = []
+    bucket = bucket_start(start, granularity)
+    while bucket <= end:
+        labels.append(bucket.isoformat())
+        if len(labels) > MAX_ACTIVITY_BUCKETS:
+            raise InvalidActivityRange(f"range spans more than {MAX_ACTIVITY_BUCKETS} {granularity}s")
+        bucket = _next_bucket(bucket, granularity)
+
+    bucket_column = _bucket_expression(granularity).label('bucket')
+    rows = db.session.query(
+        bucket_column, *[func.sum(getattr(DailyActivity, metric)) for metric in METRICS]
+    ).filter(
+        DailyActivity.user_id == user_id,
+        DailyActivity.day >= start,
+        DailyActivity.day <= end
+    ).group_by(bucket_column).all()
+
+    totals = {row[0]: row[1:] for row in rows}
+    zeros = (0,) * len(METRICS)
+    result = {'labels': labels, 'granularity': granularity}
+    for i, metric in enumerate(METRICS):
+        result[metric] = [totals.get(label, zeros)[i] for label in labels]
+    return result
+
+
+def parse_day(value):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise InvalidActivityRange(f"invalid date: {value}")
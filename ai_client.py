@@ -0,0 +1,52 @@
+import os
+import threading
+
+
+class AIClient:
+    """Process-wide Gemini client, built on first use.
+
+    Importing google.generativeai takes most of a second, so init_app() only
+    records GEMINI_API_KEY and GEMINI_MODEL. The SDK is imported and the model
+    built the first time a prompt is sent, once per process, which keeps
+    worker boot and `flask db` commands from paying for it. generate(prompt)
+    returns the response text, the interface the moderation pipeline expects
+    of a model client.
+    """
+
+    def __init__(self, app=None):
+        self.api_key = None
+        self.model_name = 'gemini-pro'
+        self._model = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('GEMINI_API_KEY', os.getenv('GEMINI_API_KEY'))
+        app.config.setdefault('GEMINI_MODEL', 'gemini-pro')
+        self.api_key = app.config['GEMINI_API_KEY']
+        self.model_name = app.config['GEMINI_MODEL']
+        self._model = None
+        app.extensions['ai_client'] = self
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, prompt):
+        response = self.model.generate_content(prompt)
+        return getattr(response, 'text', '') or ''
+
+
+ai_client = AIClient()
@@ -1,25 +1,50 @@
-import json
 import logging
 import random
-import re
 import os
-import emojis
+import click
 from flask import Flask, abort, render_template, request, jsonify, redirect, url_for, flash, session
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 from flask_socketio import SocketIO, emit, join_room, leave_room
-import google.generativeai as genai
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from sqlalchemy import func, or_, case
-
-from models import Comment, Follow, Like, Message, Notification, User, Post, db
+from sqlalchemy import func, or_, case, select
+
+from models import Comment, Like, Message, Notification, User, Post, db
+from ai_client import ai_client
+from activity import InvalidActivityRange, drop_activity, get_activity, parse_day, record_activity, retract_activity
+from broker import message_queue_options
+from conversations import (
+    INBOX_PAGE_SIZE, MESSAGES_PAGE_SIZE, delete_conversation, get_conversation_page, get_inbox_page,
+    get_latest_message, mark_conversation_read, search_users, serialize_message,
+    serialize_summary, serialize_user
+)
+from counters import bump_comment_count, reconcile_follow_counters, reconcile_post_counters
+from delivery import message_delivery
+from feed import FEED_PAGE_SIZE, get_feed_page, serialize_post
+from follows import drop_follows, follow_user, is_following_many, unfollow_user
+from likes import drop_post_likes, drop_user_likes, toggle_like
+from media import media_url, save_upload, send_media
+from mentions import existing_usernames, link_mentions, mentioned_usernames
+from moderation import POST_PENDING, POST_PUBLISHED, check_content, moderation_pipeline
+from moderation_cache import verdict_cache
+from notifications import (
+    NOTIFICATIONS_PAGE_SIZE, get_notifications_page, mark_all_read, notify, notify_mentions,
+    serialize_notification, unread_count
+)
+from pagination import InvalidCursor
+from prefilter import prefilter
+from profile_cache import profile_cache
+from sqlite_tuning import sqlite_tuning
+from tasks import create_notification as create_notification_task, task_queue
+from typing_relay import typing_relay
+from write_behind import WriteBehindTimeout, write_behind
 
 load_dotenv()
-app = Flask(__name__)
+# INSTANCE_PATH moves the database and the other instance files, e.g. for the tests
+app = Flask(__name__, instance_path=os.getenv('INSTANCE_PATH'))
 
 # Configure your database URI
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///social_media.db'
@@ -29,6 +54,8 @@ app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max-limit
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)  # Set session to last for 30 days
 
+# WAL, busy_timeout and pool sizing for SQLite; must run before db.init_app builds the engine
+sqlite_tuning.init_app(app)
 db.init_app(app)
 
 from cache_utils import cache
@@ -36,10 +63,27 @@ from cache_utils import cache
 
 cache.init_app(app)
 
-socketio = SocketIO(app, message_queue='memory://')
+# Emits fan out to every worker through this queue. Defaults to a SQLite file
+# shared by workers on one host; set a redis:// or amqp:// URL across hosts
+app.config['SOCKETIO_MESSAGE_QUEUE'] = os.getenv(
+    'SOCKETIO_MESSAGE_QUEUE', 'sqlite:///' + os.path.join(app.instance_path, 'socketio_queue.db'))
+socketio = SocketIO(app, **message_queue_options(app.config['SOCKETIO_MESSAGE_QUEUE']))
+
+# The Gemini SDK is imported on the first prompt, not at boot
+ai_client.init_app(app)
 
-genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-model = genai.GenerativeModel('gemini-pro')
+# Set MODERATION_CLIENT=fake to moderate posts offline
+app.config['MODERATION_CLIENT'] = os.getenv('MODERATION_CLIENT', 'gemini')
+prefilter.init_app(app)
+verdict_cache.init_app(app)
+moderation_pipeline.init_app(app, socketio, client=ai_client)
+message_delivery.init_app(app, socketio)
+typing_relay.init_app(app, socketio)
+task_queue.init_app(app)
+profile_cache.init_app(app)
+# Set WRITE_BEHIND_ENABLED=1 to batch likes and comments into shared commits
+app.config['WRITE_BEHIND_ENABLED'] = os.getenv('WRITE_BEHIND_ENABLED') == '1'
+write_behind.init_app(app)
 
 
 
@@ -50,9 +94,22 @@ from prof import profile as profile_blueprint  # Import your blueprint
 app.register_blueprint(profile_blueprint)
 
 
+@app.errorhandler(WriteBehindTimeout)
+def write_behind_timeout(e):
+    # The like or comment was withdrawn unwritten, so retrying is safe
+    return jsonify({'error': 'The server is busy, please try again.'}), 503
+
+
 def is_valid_input(text):
     return text and len(text.strip()) > 0
 
+# Templates pick the smallest stored copy of an upload with media_url(filename, width)
+app.add_template_global(media_url)
+
+@app.route('/media/<path:filename>')
+def media(filename):
+    return send_media(filename)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif', 'mp4'}
 
@@ -60,18 +117,33 @@ from flask_login import current_user, login_required
 
 @app.route('/')
 def index():
+    next_cursor = None
     if current_user.is_authenticated:
         all_users = User.query.all()
-        all_posts = Post.query.order_by(Post.timestamp.desc()).all()
-        
-        # Add comment counts to each post
-        for post in all_posts:
-            post.comment_count = post.comments.count()
+        # First page of the feed; later pages are fetched from /api/feed
+        all_posts, next_cursor = get_feed_page(current_user.id)
     else:
         all_users = []
         all_posts = []
 
-    return render_template('index.html', all_users=all_users, all_posts=all_posts)
+    return render_template('index.html', all_users=all_users, all_posts=all_posts, next_cursor=next_cursor)
+
+
+@app.route('/api/feed')
+@login_required
+def api_feed():
+    cursor = request.args.get('cursor')
+    per_page = request.args.get('per_page', FEED_PAGE_SIZE, type=int)
+    try:
+        posts, next_cursor = get_feed_page(current_user.id, cursor=cursor, per_page=per_page)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'posts': [serialize_post(post) for post in posts],
+        'html': ''.join(render_template('_post_card.html', post=post) for post in posts),
+        'next_cursor': next_cursor
+    })
 
 
 login_manager = LoginManager(app)
@@ -116,56 +188,68 @@ def register():
         return redirect(url_for('login'))
     return render_template('register.html')
 
-@app.template_filter('replace_usernames')
-def replace_usernames(text):
-    def replace_username(match):
-        username = match.group(1)
-        return f'<a href="{url_for("profile", username=username)}" class="text-blue-500 hover:underline">@{username}</a>'
-    
-    return re.sub(r'@(\w+)', replace_username, text)
+@app.cli.command('reconcile-counters')
+@click.option('--dry-run', is_flag=True, help='Report drifted posts and users without fixing them.')
+def reconcile_counters_command(dry_run):
+    """Backfill and check the denormalized counters on Post and User."""
+    drift = reconcile_post_counters(fix=not dry_run)
+    for post_id, like_count, actual_likes, comment_count, actual_comments in drift:
+        click.echo(f"post {post_id}: likes {like_count} -> {actual_likes}, comments {comment_count} -> {actual_comments}")
+    follow_drift = reconcile_follow_counters(fix=not dry_run)
+    for user_id, followers_count, actual_followers, following_count, actual_following in follow_drift:
+        click.echo(f"user {user_id}: followers {followers_count} -> {actual_followers}, following {following_count} -> {actual_following}")
+    verb = 'Found' if dry_run else 'Fixed'
+    click.echo(f"{verb} {len(drift)} post(s) and {len(follow_drift)} user(s) with drifted counters.")
+
+@app.cli.command('sqlite-settings')
+def sqlite_settings_command():
+    """Show the pragmas and pool size the app's database connections actually use."""
+    with db.engine.connect() as connection:
+        for name, value in sqlite_tuning.settings(connection).items():
+            click.echo(f"{name} = {value}")
+    click.echo(f"pool = {db.engine.pool.status()}")
+
+@app.cli.command('link-mentions')
+@click.option('--batch-size', default=500, show_default=True, help='Posts rendered per commit.')
+def link_mentions_command(batch_size):
+    """Render content_html for posts written before mentions were linked at write time."""
+    linked = 0
+    with app.test_request_context():
+        while True:
+            posts = Post.query.filter(Post.content_html.is_(None)).order_by(Post.id).limit(batch_size).all()
+            if not posts:
+                break
+            known = existing_usernames({name for post in posts for name in mentioned_usernames(post.content)})
+            for post in posts:
+                post.content_html = link_mentions(post.content, known)
+            db.session.commit()
+            linked += len(posts)
+    click.echo(f"Rendered {linked} post(s).")
 
 @app.route('/api/user_activity/<int:user_id>')
 @login_required
 def user_activity(user_id):
-    user = User.query.get_or_404(user_id)
-    
-    # Get posts count for the last 30 days
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    post_counts = db.session.query(
-        func.date(Post.timestamp).label('date'),
-        func.count(Post.id).label('count')
-    ).filter(
-        Post.user_id == user_id,
-        Post.timestamp >= thirty_days_ago
-    ).group_by(func.date(Post.timestamp)).all()
-    
-    dates = [(thirty_days_ago + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(31)]
-    counts = [0] * 31
-    
-    for date, count in post_counts:
-        index = (date.date() - thirty_days_ago.date()).days
-        counts[index] = count
-    
-    return jsonify({
-        'labels': dates,
-        'posts': counts
-    })
-
-
+    User.query.get_or_404(user_id)
+    # Served from the daily rollup: ?start=&end= (YYYY-MM-DD, default the last
+    # 30 days) and ?granularity=day|week|month
+    try:
+        activity = get_activity(
+            user_id,
+            start=parse_day(request.args.get('start')),
+            end=parse_day(request.args.get('end')),
+            granularity=request.args.get('granularity', 'day')
+        )
+    except InvalidActivityRange as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(activity)
 
-@app.route('/profile/<username>')
-@login_required
-def user_profile(username):
-    user = User.query.filter_by(username=username).first_or_404()
-    posts = Post.query.filter_by(user_id=user.id).all()
-    followers_count = user.followers.count()  # Assuming you have a way to get the count of followers
-    return render_template('profile.html', user=user, posts=posts, followers_count=followers_count)
 
 
 @app.route('/edit_profile', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
     if request.method == 'POST':
+        old_username = current_user.username
         username = request.form.get('username')
         email = request.form.get('email')
         bio = request.form.get('bio')
@@ -183,11 +267,10 @@ def edit_profile():
         if 'profile_picture' in request.files:
             file = request.files['profile_picture']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file.save(os.path.join('static/uploads', filename))
-                current_user.profile_picture = filename
+                current_user.profile_picture = save_upload(file)
 
         db.session.commit()
+        profile_cache.invalidate(old_username, current_user.username)
         flash('Your profile has been updated.', 'success')
         return redirect(url_for('prof.user_profile', username=current_user.username))
 
@@ -202,11 +285,13 @@ def follow(username):
     if user == current_user:
         return jsonify({'error': 'You cannot follow yourself!'}), 400
     
-    if not current_user.is_following(user):
-        current_user.follow(user)
+    if follow_user(current_user.id, user.id):
+        db.session.commit()
+        profile_cache.invalidate(current_user.username, user.username)
+        notify(user.id, 'follow', current_user.id)
         return jsonify({
             'message': f'You are now following {username}!',
-            'followerCount': user.followers.count()
+            'followerCount': user.followers_count
         })
     else:
         return jsonify({'error': 'You are already following this user.'}), 400
@@ -220,11 +305,12 @@ def unfollow(username):
     if user == current_user:
         return jsonify({'error': 'You cannot unfollow yourself!'}), 400
     
-    if current_user.is_following(user):
-        current_user.unfollow(user)
+    if unfollow_user(current_user.id, user.id):
+        db.session.commit()
+        profile_cache.invalidate(current_user.username, user.username)
         return jsonify({
             'message': f'You have unfollowed {username}.',
-            'followerCount': user.followers.count()
+            'followerCount': user.followers_count
         })
     else:
         return jsonify({'error': 'You are not following this user.'}), 400
@@ -233,9 +319,15 @@ def unfollow(username):
 @login_required
 def delete_account():
     try:
-
+        username = current_user.username
+        # Follow edges and likes are only reachable through viewonly relationships, so drop them explicitly
+        affected_ids = (drop_follows(current_user.id) | drop_user_likes(current_user.id)
+                        | drop_user_comments(current_user.id))
+        drop_activity(current_user.id)
+        affected = [name for name, in db.session.query(User.username).filter(User.id.in_(affected_ids))]
         db.session.delete(current_user)
         db.session.commit()
+        profile_cache.invalidate(username, *affected)
         flash('Your account has been successfully deleted.')
         return jsonify({'message': 'Account deleted successfully', 'redirect': url_for('register')})
     except Exception as e:
@@ -248,6 +340,23 @@ logger = logging.getLogger(__name__)
 
 from flask import render_template, flash, redirect, url_for
 
+def create_pending_post(content):
+    # Write the post as pending and hand it to the background moderator; the
+    # verdict reaches the author over Socket.IO as 'post_moderated'
+    new_post = Post(content=content, content_html=link_mentions(content), user_id=current_user.id,
+                    timestamp=datetime.utcnow(), status=POST_PENDING)
+
+    if 'media' in request.files:
+        file = request.files['media']
+        if file and allowed_file(file.filename):
+            new_post.media_url = save_upload(file)
+
+    db.session.add(new_post)
+    db.session.commit()
+
+    moderation_pipeline.submit(new_post.id, current_user.id, content)
+    return new_post
+
 @app.route('/post', methods=['POST'])
 @login_required
 def post():
@@ -256,66 +365,17 @@ def post():
         flash('Post content cannot be empty!', 'error')
         return redirect(url_for('index'))
 
-    # Use Gemini model to check for community guideline violations
-    prompt = f"""
-    Analyze the following text for any violations of community guidelines. 
-    If violations are found, provide a friendly explanation and suggest 3 alternative wordings.
-    Make the suggestions fun and engaging.
-    Text to analyze: "{user_input}"
-    
-    Respond in the following JSON format:
-    {{
-        "violates_guidelines": boolean,
-        "explanation": "string",
-        "suggestions": ["string"]
-    }}
-    """
     try:
-        response = model.generate_content(prompt)
-        logger.debug(f"Gemini response text: {response.text}")
-        
-        # Extract JSON from the response
-        json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-        if json_match:
-            response_json = json_match.group(0)
-            try:
-                response_data = json.loads(response_json)
-            except json.JSONDecodeError as e:
-                logger.error(f"JSONDecodeError: {str(e)} - Response: {response_json}")
-                flash('An error occurred while processing your post. Please try again.', 'error')
-                return redirect(url_for('index'))
-        else:
-            raise ValueError("No valid JSON found in the response")
-        
-        logger.debug(f"Parsed response data: {response_data}")
-
-        if response_data.get('violates_guidelines', False):
-            flash(response_data.get('explanation', 'Your post may violate community guidelines.'), 'warning')
-            return render_template('index.html', 
-                                   violation_suggestions=response_data.get('suggestions', []),
-                                   original_content=user_input)
-        
-        # If no violations, create the post
-        new_post = Post(content=user_input, user_id=current_user.id, timestamp=datetime.utcnow())
-        
-        if 'media' in request.files:
-            file = request.files['media']
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                new_post.media_url = filename
-        
-        db.session.add(new_post)
-        db.session.commit()
-        
-        flash('Your post has been created successfully!', 'success')
+        create_pending_post(user_input)
+        flash('Your post is being reviewed and will appear shortly.', 'success')
         return redirect(url_for('index'))
 
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Error processing or saving post: {str(e)}", exc_info=True)
         flash('An error occurred while processing your post. Please try again.', 'error')
         return redirect(url_for('index'))
+
 @app.route('/submit_post', methods=['POST'])
 @login_required
 def submit_post():
@@ -323,72 +383,62 @@ def submit_post():
     if not content:
         return jsonify({'error': 'Post content cannot be empty!'}), 400
 
-    
-    prompt = f"""
-    Analyze the following text for any violations of community guidelines. 
-    If violations are found, provide a friendly explanation and suggest 3 alternative wordings.
-    Make the suggestions fun and engaging.
-    Text to analyze: "{content}"
-    
-    Respond in the following JSON format:
-    {{
-        "violates_guidelines": boolean,
-        "explanation": "string",
-        "suggestions": ["string"]
-    }}
-    """
     try:
-        response = model.generate_content(prompt)
-        logger.debug(f"Gemini response text: {response.text}")
-        
-        json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-        if json_match:
-            response_data = json.loads(json_match.group(0))
-        else:
-            raise ValueError("No valid JSON found in the response")
-        
-        logger.debug(f"Parsed response data: {response_data}")
-
-        if response_data.get('violates_guidelines', False):
-            return jsonify({
-                'violates_guidelines': True,
-                'explanation': response_data.get('explanation', 'No explanation provided.'),
-                'suggestions': response_data.get('suggestions', [])
-            }), 200
-        
-        # If no violations, create the post
-        new_post = Post(content=content, user_id=current_user.id, timestamp=datetime.utcnow())
-        
-        if 'media' in request.files:
-            file = request.files['media']
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                new_post.media_url = filename
-        
-        db.session.add(new_post)
-        db.session.commit()
-        
-        return jsonify({'success': True, 'message': 'Your post has been created!'}), 200
+        new_post = create_pending_post(content)
+        return jsonify({
+            'success': True,
+            'post_id': new_post.id,
+            'status': POST_PENDING,
+            'message': 'Your post is being reviewed and will appear shortly.'
+        }), 202
 
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Error processing or saving post: {str(e)}", exc_info=True)
         return jsonify({'error': 'An error occurred while processing your post. Please try again.'}), 500
 
     
 
 
+@app.route('/api/moderation/cache_stats')
+@login_required
+def moderation_cache_stats():
+    return jsonify(verdict_cache.stats())
+
+@app.route('/api/moderation/prefilter_stats')
+@login_required
+def moderation_prefilter_stats():
+    return jsonify(prefilter.stats())
+
+@app.route('/api/cache/profile_stats')
+@login_required
+def profile_cache_stats():
+    return jsonify(profile_cache.stats())
+
+@app.route('/api/write_behind/stats')
+@login_required
+def write_behind_stats():
+    return jsonify(write_behind.stats())
+
+@app.route('/api/cache/stats')
+@login_required
+def cache_stats():
+    backend = cache.cache
+    if not hasattr(backend, 'stats'):
+        return jsonify({'error': 'The configured cache backend does not report stats'}), 404
+    return jsonify(backend.stats())
+
+
 @app.route('/like/<int:post_id>', methods=['POST'])
 @login_required
 def like_post(post_id):
     post = Post.query.get_or_404(post_id)
-    if current_user not in post.likes:
-        post.likes.append(current_user)
-    else:
-        post.likes.remove(current_user)
-    db.session.commit()
-    return jsonify({'likes_count': len(post.likes), 'is_liked': current_user in post.likes})
+    is_liked = write_behind.run(toggle_like, post_id, current_user.id)
+    if is_liked:
+        notify(post.user_id, 'like', current_user.id, post.id)
+
+    likes_count = db.session.query(Post.like_count).filter_by(id=post_id).scalar()
+    return jsonify({'likes_count': likes_count, 'is_liked': is_liked})
 
 @app.route('/comment/<int:post_id>', methods=['POST'])
 @login_required
@@ -396,17 +446,52 @@ def add_comment(post_id):
     post = Post.query.get_or_404(post_id)
     content = request.json.get('content')
     if content:
-        comment = Comment(content=content, author=current_user, post=post)
-        db.session.add(comment)
-        db.session.commit()
-        return jsonify({
-            'id': comment.id,
-            'content': comment.content,
-            'author': comment.author.username,
-            'timestamp': comment.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        }), 201
+        comment = write_behind.run(store_comment, post.id, current_user.id, content)
+        notify(post.user_id, 'comment', current_user.id, post.id)
+        notify_mentions(content, current_user.id, post.id)
+        comment['author'] = current_user.username
+        return jsonify(comment), 201
     return jsonify({'error': 'Comment content is required'}), 400
 
+def drop_user_comments(user_id):
+    """Remove the user's comments and the comments on the user's posts, e.g. before deleting the account.
+
+    Posts the user had commented on lose those comments from comment_count,
+    and other commenters lose theirs from the activity rollup. Returns the
+    ids of the other users whose posts changed. Callers commit.
+    """
+    commented_ids = select(Comment.post_id).where(Comment.author_id == user_id)
+    affected = {author_id for author_id, in db.session.execute(
+        select(Post.user_id).where(Post.id.in_(commented_ids)).distinct()
+    )}
+    authored = select(func.count()).where(
+        Comment.post_id == Post.id, Comment.author_id == user_id
+    ).scalar_subquery()
+    Post.query.filter(Post.id.in_(commented_ids)).update(
+        {Post.comment_count: Post.comment_count - authored}, synchronize_session=False
+    )
+    own_post_ids = select(Post.id).where(Post.user_id == user_id)
+    removed = db.session.execute(
+        Comment.__table__.delete().where((Comment.author_id == user_id) | Comment.post_id.in_(own_post_ids))
+        .returning(Comment.author_id, Comment.timestamp)
+    ).all()
+    retract_activity('comments', [(author_id, when) for author_id, when in removed if author_id != user_id])
+    affected.discard(user_id)
+    return affected
+
+def store_comment(post_id, author_id, content):
+    # Runs through write_behind, possibly on its flusher thread
+    comment = Comment(content=content, author_id=author_id, post_id=post_id)
+    db.session.add(comment)
+    bump_comment_count(post_id, 1)
+    record_activity(author_id, 'comments')
+    db.session.flush()
+    return {
+        'id': comment.id,
+        'content': comment.content,
+        'timestamp': comment.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
 @app.route('/comment/<int:comment_id>', methods=['DELETE'])
 @login_required
 def delete_comment(comment_id):
@@ -414,6 +499,8 @@ def delete_comment(comment_id):
     if comment.author != current_user:
         return jsonify({'error': 'Unauthorized'}), 403
     db.session.delete(comment)
+    bump_comment_count(comment.post_id, -1)
+    retract_activity('comments', [(comment.author_id, comment.timestamp)])
     db.session.commit()
     return jsonify({'message': 'Comment deleted successfully'}), 200
 
@@ -421,8 +508,18 @@ def delete_comment(comment_id):
 def delete_post(post_id):
     post = Post.query.get(post_id)
     if post:
+        author_username = post.author.username
+        drop_post_likes(post.id)
+        # Comments go with the post, and out of their authors' activity
+        removed_comments = db.session.execute(
+            Comment.__table__.delete().where(Comment.post_id == post.id).returning(Comment.author_id, Comment.timestamp)
+        ).all()
+        retract_activity('comments', removed_comments)
+        if post.status == POST_PUBLISHED:
+            retract_activity('posts', [(post.user_id, post.timestamp)])
         db.session.delete(post)
         db.session.commit()
+        profile_cache.invalidate(author_username)
         return jsonify({"status": "success"}), 200
     return jsonify({"status": "error", "message": "Post not found"}), 404
 
@@ -440,23 +537,72 @@ def conversations():
 @login_required
 #@cache.cached(timeout=60, key_prefix='messages_%s')  # Cache for 1 minute
 def messages(recipient_id):
-    available_users = get_available_users()
+    # The sidebar is the user's inbox; other users are found through /api/users/search
+    inbox, inbox_cursor = get_inbox_page(current_user.id)
     
-    if recipient_id is None and available_users:
-        recipient_id = available_users[0]['id']
+    if recipient_id is None and inbox:
+        recipient_id = inbox[0].other_user_id
     
     recipient = User.query.get(recipient_id) if recipient_id else None
-    messages = get_messages(current_user.id, recipient_id) if recipient_id else []
-    starters = get_conversation_starters(current_user.id, recipient_id) if recipient_id else []
+    if recipient and mark_conversation_read(current_user.id, recipient.id):
+        db.session.commit()
+    # History is fetched by the page from /api/messages/<recipient_id>
+    starters = get_conversation_starters(current_user.id, recipient_id) if recipient else []
     
     return render_template('messages.html', 
-                           messages=messages, 
                            starters=starters, 
                            recipient=recipient, 
-                           available_users=available_users,
+                           inbox=inbox,
+                           inbox_cursor=inbox_cursor,
                            current_user=current_user)
 
 
+@app.route('/api/inbox')
+@login_required
+def api_inbox():
+    cursor = request.args.get('cursor')
+    per_page = request.args.get('per_page', INBOX_PAGE_SIZE, type=int)
+    try:
+        inbox, next_cursor = get_inbox_page(current_user.id, cursor=cursor, per_page=per_page)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'conversations': [serialize_summary(summary) for summary in inbox],
+        'next_cursor': next_cursor
+    })
+
+
+@app.route('/api/users/search')
+@login_required
+def api_search_users():
+    users = search_users(request.args.get('q', ''), exclude_user_id=current_user.id)
+    following = is_following_many(current_user.id, [user.id for user in users])
+    return jsonify({'users': [dict(serialize_user(user), following=user.id in following) for user in users]})
+
+
+@app.route('/api/typing/stats')
+@login_required
+def typing_stats():
+    return jsonify(typing_relay.stats())
+
+
+@app.route('/api/messages/<int:recipient_id>')
+@login_required
+def api_messages(recipient_id):
+    before = request.args.get('before')
+    per_page = request.args.get('per_page', MESSAGES_PAGE_SIZE, type=int)
+    try:
+        rows, next_before = get_conversation_page(current_user.id, recipient_id, before=before, per_page=per_page)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'messages': [serialize_message(message, sender) for message, sender in rows],
+        'next_before': next_before
+    })
+
+
 @app.route('/api/conversation_starters/<int:recipient_id>')
 @login_required
 def api_conversation_starters(recipient_id):
@@ -503,30 +649,11 @@ def get_conversation_starters(user_id, other_user_id):
 @app.route('/send_message/<int:recipient_id>', methods=['POST'])
 @login_required
 def send_message_route(recipient_id):
-    content = request.form['content']
-    
-    if not content.strip():
-        return jsonify({"error": "Message content cannot be empty"}), 400
-
-    new_message = Message(
-        sender_id=current_user.id,
-        recipient_id=recipient_id,
-        content=content,
-        timestamp=datetime.utcnow()
-    )
-    
-    db.session.add(new_message)
-    db.session.commit()
+    message_data, error = message_delivery.send(current_user, recipient_id, request.form['content'])
+    if error:
+        return jsonify({"error": error}), 400
 
-    return jsonify({
-        'id': new_message.id,
-        'sender_id': current_user.id,
-        'recipient_id': recipient_id,
-        'content': content,
-        'timestamp': new_message.timestamp.isoformat(),
-        'sender_username': current_user.username,
-        'sender_profile_picture': current_user.profile_picture
-    }), 200
+    return jsonify(message_data), 200
 
 
 
@@ -538,12 +665,12 @@ def generate_ai_reply(content):
     Do not use asterisks or any other formatting. The reply should be ready to send as-is.
     """
     
-    response = model.generate_content(prompt)
+    reply = ai_client.generate(prompt)
     
     # Check if the response contains text
-    if hasattr(response, 'text') and response.text:
+    if reply:
         # Remove any remaining asterisks from the response
-        cleaned_response = response.text.replace('*', '')
+        cleaned_response = reply.replace('*', '')
         
         return cleaned_response
     else:
@@ -558,81 +685,30 @@ def api_generate_ai_reply(recipient_id):
         return jsonify({'error': 'No recipient specified'}), 400
     try:
         # Fetch the latest message content from the chat with the recipient
-        last_message = Message.query.filter(
-            ((Message.sender_id == current_user.id) & (Message.recipient_id == recipient_id)) |
-            ((Message.sender_id == recipient_id) & (Message.recipient_id == current_user.id))
-        ).order_by(Message.timestamp.desc()).first()
+        last_message = get_latest_message(current_user.id, recipient_id)
         
         if last_message:
             content = last_message.content
             ai_reply = generate_ai_reply(content)
             
-            # Send the AI reply to the chat
-            new_message, error = send_message_helper(current_user.id, recipient_id, ai_reply)
+            # Send the AI reply to the chat; delivery pushes it to both users
+            message_data, error = message_delivery.send(current_user, recipient_id, ai_reply)
             if error:
                 return jsonify({'error': error}), 400
             
-            message_data = {
-                'id': new_message.id,
-                'sender_id': current_user.id,
-                'recipient_id': recipient_id,
-                'content': ai_reply,
-                'timestamp': new_message.timestamp.isoformat()
-            }
-            
-            # Broadcast the AI message to both users
-            socketio.emit('new_message', message_data, room=str(recipient_id))
-            socketio.emit('new_message', message_data, room=str(current_user.id))
-            
-            return jsonify({'reply': ai_reply}), 200
+            return jsonify({'reply': ai_reply, 'message': message_data}), 200
         else:
             return jsonify({'error': 'No previous message found to base AI reply on'}), 400
     except Exception as e:
         app.logger.error(f"Error generating AI reply: {str(e)}")
         return jsonify({'error': 'Failed to generate AI reply'}), 500
     
-def send_message_helper(sender_id, recipient_id, content, media_url=None):
-    try:
-        if not content.strip():
-            return None, "Message content cannot be empty."
-
-        new_message = Message(
-            sender_id=sender_id,
-            recipient_id=recipient_id,
-            content=content,
-            media_url=media_url,
-            timestamp=datetime.utcnow()
-        )
-
-        db.session.add(new_message)
-        db.session.commit()
-
-        return new_message, None
-
-    except Exception as e:
-        db.session.rollback()
-        return None, f"An error occurred: {str(e)}"
-    
-def get_messages(current_user_id, recipient_id, page=1, per_page=20):
-    messages = db.session.query(Message, User).join(User, Message.sender_id == User.id).filter(
-        or_(
-            (Message.sender_id == current_user_id) & (Message.recipient_id == recipient_id),
-            (Message.sender_id == recipient_id) & (Message.recipient_id == current_user_id)
-        )
-    ).order_by(Message.timestamp.asc()).paginate(page=page, per_page=per_page, error_out=False)
-
-    return messages.items
 @app.route('/delete_chat_history/<int:recipient_id>', methods=['POST'])
 @login_required
 def delete_chat_history(recipient_id):
     try:
         # Delete messages where the current user is either the sender or the recipient
-        Message.query.filter(
-            or_(
-                (Message.sender_id == current_user.id) & (Message.recipient_id == recipient_id),
-                (Message.sender_id == recipient_id) & (Message.recipient_id == current_user.id)
-            )
-        ).delete(synchronize_session=False)
+        delete_conversation(current_user.id, recipient_id)
 
         # Commit the changes to the database
         db.session.commit()
@@ -643,43 +719,46 @@ def delete_chat_history(recipient_id):
         db.session.rollback()
         return jsonify({"success": False, "message": str(e)}), 500
 
-def get_available_users():
-    users = User.query.filter(User.id != current_user.id).all()
-    return [{'id': user.id, 'username': user.username, 'profile_picture': user.profile_picture} for user in users]
 
 
 
 @app.route('/notifications')
 @login_required
 def notifications():
-    notifications = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.timestamp.desc()).all()
-    # Mark all notifications as read
-    for notification in notifications:
-        notification.read = True
-    db.session.commit()
-    return render_template('notifications.html', notifications=notifications)
+    # Older pages come from /api/notifications; opening the page reads everything
+    notifications, next_cursor = get_notifications_page(current_user.id)
+    mark_all_read(current_user.id)
+    return render_template('notifications.html', notifications=notifications, next_cursor=next_cursor)
+
+
+@app.route('/api/notifications')
+@login_required
+def api_notifications():
+    cursor = request.args.get('cursor')
+    per_page = request.args.get('per_page', NOTIFICATIONS_PAGE_SIZE, type=int)
+    try:
+        notifications, next_cursor = get_notifications_page(current_user.id, cursor=cursor, per_page=per_page)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'notifications': [serialize_notification(notification) for notification in notifications],
+        'next_cursor': next_cursor
+    })
 
-from tasks import create_notification as create_notification_task
+
+@app.route('/api/notifications/unread_count')
+@login_required
+def api_notifications_unread_count():
+    return jsonify({'unread_count': unread_count(current_user.id)})
 
 def create_notification(user_id, content):
     create_notification_task.delay(user_id, content)
 
     
-def get_messages(current_user_id, recipient_id, page=1, per_page=20):
-    messages = db.session.query(Message, User).join(User, Message.sender_id == User.id).filter(
-        or_(
-            (Message.sender_id == current_user_id) & (Message.recipient_id == recipient_id),
-            (Message.sender_id == recipient_id) & (Message.recipient_id == current_user_id)
-        )
-    ).order_by(Message.timestamp.asc()).paginate(page=page, per_page=per_page, error_out=False)
 
-    return messages.items
 
 
-def get_available_users():
-    users = User.query.filter(User.id != current_user.id).all()
-    return [{'id': user.id, 'username': user.username, 'profile_picture': user.profile_picture} for user in users]
-
 
 
 
@@ -687,22 +766,20 @@ def get_available_users():
     
 @socketio.on('typing')
 def handle_typing(data):
-    recipient_id = data['recipient_id']
-    socketio.emit('typing', {'sender_id': current_user.id}, room=str(recipient_id))
+    typing_relay.typing(current_user.id, int(data['recipient_id']))
 
 @socketio.on('stop_typing')
 def handle_stop_typing(data):
-    recipient_id = data['recipient_id']
-    socketio.emit('stop_typing', {'sender_id': current_user.id}, room=str(recipient_id))
-
-@socketio.on('message_read')
-def handle_message_read(data):
-    message_id = data['message_id']
-    message = Message.query.get(message_id)
-    if message:
-        message.read = True
-        db.session.commit()
-        socketio.emit('message_status_update', {'message_id': message_id, 'read': True}, room=str(message.sender_id))
+    typing_relay.stop_typing(current_user.id, int(data['recipient_id']))
+
+@socketio.on('messages_read')
+def handle_messages_read(data):
+    # "I've read everything sender_id sent me up to message up_to_id"
+    message_delivery.mark_read(current_user.id, data['sender_id'], data['up_to_id'])
+
+@socketio.on('messages_delivered')
+def handle_messages_delivered(data):
+    message_delivery.acknowledge_delivered(current_user.id, data.get('message_ids', []))
 
 @socketio.on('connect')
 def handle_connect():
@@ -719,73 +796,15 @@ def make_session_permanent():
     session.permanent = True
     app.permanent_session_lifetime = timedelta(days=30)
     
-@cache.memoize(300)
 def moderate_content(content):
-    prompt = f"""
-    Analyze the following content for appropriateness on a social media platform. Please take into account common community guidelines which may include but are not limited to: harassment, hate speech, violence, explicit content, misinformation, and spam.
-
-    Content to analyze:
-    "{content}"
-
-    Please provide the following in your response:
-    1. **Violates Guidelines**: Determine if the content violates any common social media community guidelines. Respond with `true` if it violates, otherwise `false`.
-    2. **Explanation**: Provide a brief explanation for your determination. Mention which specific guideline(s) are potentially violated or why the content is considered appropriate.
-    3. **Sentiment Analysis**: Analyze the sentiment of the content and classify it as `positive`, `neutral`, or `negative`. Provide reasoning for the sentiment classification.
-    4. **Suggestions for Improvement**: If the content is borderline inappropriate or has potential issues, suggest specific ways to improve it to make it more suitable for a social media platform. 
-
-    Format your response as a JSON object with the following keys:
-    - `"violates_guidelines"`: (boolean) `true` or `false` indicating if the content violates guidelines.
-    - `"explanation"`: (string) A brief explanation of why the content does or does not violate guidelines.
-    - `"sentiment"`: (string) The sentiment analysis result, which can be `positive`, `neutral`, or `negative`.
-    - `"suggestions"`: (array of strings) Suggestions for improving the content if needed.
-
-    Example of a JSON response:
-    {{
-        "violates_guidelines": true,
-        "explanation": "The content contains explicit language which violates our community guidelines on harassment.",
-        "sentiment": "negative",
-        "suggestions": ["Remove explicit language", "Rephrase the content to be more respectful."]
-    }}
-    """
+    verdict = prefilter.classify(content)
+    if verdict is not None:
+        return verdict
 
     try:
-        response = model.generate_content(prompt)
-        response_text = getattr(response, 'text', '').strip()
-
-        # Log the response text for debugging
-        print(f"Response text: {response_text}")
-
-        if not response_text:
-            raise ValueError("Received an empty response from the model")
-
-        # Try to parse the JSON response
-        try:
-            moderation_result = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON: {e}")
-            print(f"Response text: {response_text}")
-            
-            # Attempt to extract JSON from the response if it's not properly formatted
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                try:
-                    moderation_result = json.loads(json_match.group())
-                except json.JSONDecodeError:
-                    raise ValueError("Unable to extract valid JSON from the model's response")
-            else:
-                raise ValueError("No JSON-like structure found in the model's response")
-
-        # Validate the structure of the moderation result
-        required_keys = ['violates_guidelines', 'explanation', 'sentiment', 'suggestions']
-        if not all(key in moderation_result for key in required_keys):
-            raise ValueError("Moderation result is missing required keys")
-
-        # Check for vulgar language
-        if moderation_result.get("violates_guidelines") and "explicit" in moderation_result.get("explanation", "").lower():
-            moderation_result["suggestions"].append("Please avoid using vulgar language.")
-
-        return moderation_result
-
+        return verdict_cache.get_or_compute(
+            'content', content, lambda: check_content(moderation_pipeline.client, content)
+        )
     except Exception as e:
         print(f"Error in moderate_content: {str(e)}")
         # Return a default response in case of any error
@@ -0,0 +1,88 @@
+"""Worker cold start: how long `import app` takes, and which imports it spends it on.
+
+Every gunicorn worker and every `flask db` command imports the app before it
+does anything else. This runs `python -X importtime -c "import app"` in fresh
+interpreters (after one warm-up run, so bytecode is cached as it would be in
+production) and reports the median wall time plus the slowest direct imports.
+Pass --rev to measure another git revision as well, e.g. the commit before a
+change, and print the difference.
+
+    python benchmarks/import_time.py --rev HEAD~1 --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def export_revision(rev):
+    directory = tempfile.mkdtemp(prefix='import-time-')
+    archive = os.path.join(directory, 'tree.tar')
+    subprocess.run(['git', 'archive', '--output', archive, rev], cwd=ROOT, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(directory, filter='data')
+    os.remove(archive)
+    return directory
+
+
+def direct_imports(stderr, module):
+    """Cumulative microseconds of each module `module` imported itself, from -X importtime output."""
+    children = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 0:
+            if name == module:
+                return sorted(children, reverse=True)
+            children = []
+        elif depth == 1:
+            children.append((int(cumulative), name))
+    return []
+
+
+def measure(directory, module, runs):
+    env = dict(os.environ, PYTHONPATH=directory)
+    command = [sys.executable, '-X', 'importtime', '-c', f'import {module}']
+    subprocess.run(command, cwd=directory, env=env, capture_output=True, check=True)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(command, cwd=directory, env=env, capture_output=True, text=True, check=True)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), direct_imports(result.stderr, module)
+
+
+def report(label, wall, imports, top):
+    print(f"{label}: {wall * 1000:.0f} ms median wall time")
+    for cumulative, name in imports[:top]:
+        print(f"    {cumulative / 1000:8.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rev', help='also measure this git revision, e.g. HEAD~1')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--top', type=int, default=10, help='direct imports to list')
+    args = parser.parse_args()
+
+    current = measure(ROOT, args.module, args.runs)
+    if args.rev:
+        before = measure(export_revision(args.rev), args.module, args.runs)
+        report(args.rev, *before, args.top)
+    report('working tree', *current, args.top)
+    if args.rev:
+        print(f"difference: {(current[0] - before[0]) * 1000:+.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Cross-process Socket.IO delivery latency through the SQLite message queue.
+
+Starts N subscriber processes that tail the queue the same way a worker's
+listener thread does, publishes M emits from this process and reports the
+publish-to-receive latency seen by every subscriber.
+
+    python benchmarks/socketio_fanout.py --subscribers 4 --messages 500
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broker import SQLiteManager  # noqa: E402
+
+
+def subscribe(url, poll_interval, expected, ready, results):
+    manager = SQLiteManager(url, write_only=True, poll_interval=poll_interval)
+    latencies = []
+    listener = manager._listen()
+    ready.set()
+    for payload in listener:
+        message = json.loads(payload)
+        latencies.append(time.time() - message['data'][0]['sent_at'])
+        if len(latencies) == expected:
+            break
+    results.put(latencies)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=500.0, help='emits per second')
+    parser.add_argument('--poll-interval', type=float, default=0.01)
+    parser.add_argument('--url', help='sqlite:/// URL of the queue (default: a temporary file)')
+    args = parser.parse_args()
+
+    url = args.url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'socketio_queue.db')
+    publisher = SQLiteManager(url, write_only=True)
+    results = multiprocessing.Queue()
+    workers = []
+    for _ in range(args.subscribers):
+        ready = multiprocessing.Event()
+        worker = multiprocessing.Process(
+            target=subscribe, args=(url, args.poll_interval, args.messages, ready, results))
+        worker.start()
+        ready.wait()
+        workers.append(worker)
+    # Let every listener take its starting position in the queue
+    time.sleep(0.2)
+
+    started = time.time()
+    for i in range(args.messages):
+        publisher.emit('new_message', {'id': i, 'sent_at': time.time()}, room=str(i % 10))
+        time.sleep(1 / args.rate)
+    publish_seconds = time.time() - started
+
+    latencies = []
+    for _ in workers:
+        latencies.extend(results.get())
+    for worker in workers:
+        worker.join()
+
+    ms = [latency * 1000 for latency in latencies]
+    print(f"{args.subscribers} subscribers, {args.messages} emits in {publish_seconds:.2f}s, "
+          f"{len(ms)} deliveries")
+    print(f"latency ms: mean {statistics.mean(ms):.2f}  p50 {percentile(ms, 50):.2f}  "
+          f"p95 {percentile(ms, 95):.2f}  p99 {percentile(ms, 99):.2f}  max {max(ms):.2f}")
+
+
+if __name__ == '__main__':
+    main()
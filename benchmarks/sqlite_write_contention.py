@@ -0,0 +1,148 @@
+"""Write throughput under contention, default SQLite settings vs sqlite_tuning.
+
+Runs the same workload twice against a fresh database file: once with the
+engine settings the app used before (rollback journal, synchronous=FULL,
+default pool) and once with the settings SQLiteTuning applies. Each of N
+worker processes runs T threads; every operation is either a like (insert
+into post_likes and bump the post's counter in one transaction) or, with
+probability --read-ratio, a feed-style read.
+
+    python benchmarks/sqlite_write_contention.py --processes 4 --threads 4 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from sqlite_tuning import SQLiteTuning  # noqa: E402
+
+POSTS = 200
+USERS = 5000
+
+
+def make_engine(url, profile):
+    if profile == 'default':
+        return create_engine(url)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    SQLiteTuning(app)
+    return create_engine(url, **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+
+
+def setup(url):
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE post (id INTEGER PRIMARY KEY, content TEXT, like_count INTEGER NOT NULL DEFAULT 0)'))
+        conn.execute(text('CREATE TABLE post_likes (post_id INTEGER, user_id INTEGER, PRIMARY KEY (post_id, user_id))'))
+        conn.execute(text('INSERT INTO post (id, content) VALUES (:id, :content)'),
+                     [{'id': i, 'content': 'x' * 200} for i in range(1, POSTS + 1)])
+    engine.dispose()
+
+
+def like(conn, rng):
+    post_id = rng.randint(1, POSTS)
+    inserted = conn.execute(
+        text('INSERT INTO post_likes (post_id, user_id) VALUES (:p, :u) ON CONFLICT DO NOTHING'),
+        {'p': post_id, 'u': rng.randint(1, USERS)}
+    ).rowcount
+    if inserted:
+        conn.execute(text('UPDATE post SET like_count = like_count + 1 WHERE id = :p'), {'p': post_id})
+
+
+def read(conn, rng):
+    conn.execute(text('SELECT id, content, like_count FROM post ORDER BY id DESC LIMIT 20 OFFSET :o'),
+                 {'o': rng.randint(0, POSTS - 20)}).fetchall()
+
+
+def worker(url, profile, threads, seconds, read_ratio, results):
+    engine = make_engine(url, profile)
+    stats = {'writes': 0, 'reads': 0, 'locked': 0, 'latencies': []}
+    lock = threading.Lock()
+    deadline = time.time() + seconds
+
+    def run(seed):
+        rng = random.Random(seed)
+        while time.time() < deadline:
+            is_read = rng.random() < read_ratio
+            started = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    (read if is_read else like)(conn, rng)
+            except OperationalError as e:
+                if 'locked' not in str(e) and 'busy' not in str(e):
+                    raise
+                with lock:
+                    stats['locked'] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                stats['reads' if is_read else 'writes'] += 1
+                stats['latencies'].append(elapsed)
+
+    pool = [threading.Thread(target=run, args=(os.getpid() * 100 + i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    engine.dispose()
+    results.put(stats)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_profile(profile, args):
+    directory = tempfile.mkdtemp()
+    url = 'sqlite:///' + os.path.join(directory, 'contention.db')
+    setup(url)
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=worker, args=(url, profile, args.threads, args.seconds, args.read_ratio, results))
+        for _ in range(args.processes)
+    ]
+    for process in workers:
+        process.start()
+    totals = {'writes': 0, 'reads': 0, 'locked': 0, 'latencies': []}
+    for _ in workers:
+        stats = results.get()
+        for key in ('writes', 'reads', 'locked'):
+            totals[key] += stats[key]
+        totals['latencies'].extend(stats['latencies'])
+    for process in workers:
+        process.join()
+
+    ms = [latency * 1000 for latency in totals['latencies']] or [0.0]
+    print(f"{profile:>8}: {totals['writes'] / args.seconds:8.0f} writes/s  {totals['reads'] / args.seconds:8.0f} reads/s  "
+          f"{totals['locked']:5d} 'database is locked'  "
+          f"latency ms p50 {percentile(ms, 50):.2f}  p99 {percentile(ms, 99):.2f}  mean {statistics.mean(ms):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4, help='worker processes, like gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='request threads per process')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--read-ratio', type=float, default=0.5)
+    parser.add_argument('--profile', choices=('default', 'tuned', 'both'), default='both')
+    args = parser.parse_args()
+
+    print(f"{args.processes} processes x {args.threads} threads, {args.seconds:.0f}s, {args.read_ratio:.0%} reads")
+    for profile in (('default', 'tuned') if args.profile == 'both' else (args.profile,)):
+        run_profile(profile, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import threading
+import time
+
+import socketio
+
+SQLITE_SCHEME = 'sqlite://'
+
+
+class SQLiteManager(socketio.PubSubManager):
+    """Socket.IO client manager that fans emits out through a SQLite file.
+
+    A local stand-in for Redis/Kombu when several workers run on one host:
+    every worker appends its emits to the same table and a background thread
+    in each worker tails it, so an emit reaches users connected to any
+    worker. Rows older than `retention` seconds are pruned by publishers.
+
+    The URL is sqlite:///relative/path.db or sqlite:////absolute/path.db.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, url='sqlite:///socketio_queue.db', channel='socketio', write_only=False,
+                 logger=None, json=None, poll_interval=0.01, retention=60):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = sqlite_path(url)
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._published = 0
+        self._local = threading.local()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS socketio_messages ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+                'payload TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_socketio_messages_created_at '
+                         'ON socketio_messages (created_at)')
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _publisher(self):
+        # Emits come from request threads and the moderation pool, so each
+        # thread publishes on its own connection
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _publish(self, data):
+        conn = self._publisher()
+        now = time.time()
+        conn.execute(
+            'INSERT INTO socketio_messages (channel, payload, created_at) VALUES (?, ?, ?)',
+            (self.channel, self.json.dumps(data), now)
+        )
+        self._published += 1
+        if self._published % 100 == 0:
+            conn.execute('DELETE FROM socketio_messages WHERE created_at < ?', (now - self.retention,))
+
+    def _sleep(self):
+        if self.server is not None:
+            self.server.sleep(self.poll_interval)
+        else:
+            time.sleep(self.poll_interval)
+
+    def _listen(self):
+        conn = self._connect()
+        # Only messages published after this worker started listening
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM socketio_messages').fetchone()[0]
+        while True:
+            rows = conn.execute(
+                'SELECT id, payload FROM socketio_messages WHERE id > ? AND channel = ? ORDER BY id',
+                (last_id, self.channel)
+            ).fetchall()
+            for row_id, payload in rows:
+                last_id = row_id
+                yield payload
+            if not rows:
+                self._sleep()
+
+
+def sqlite_path(url):
+    if not url.startswith(SQLITE_SCHEME):
+        raise ValueError(f"Not a sqlite:// URL: {url}")
+    return url[len(SQLITE_SCHEME) + 1:]
+
+
+def message_queue_options(url, channel='flask-socketio', **kwargs):
+    """SocketIO(...) keyword arguments for the configured message queue.
+
+    sqlite:// URLs get the SQLite manager; anything else (redis://, amqp://,
+    kafka://, memory://) is handed to Flask-SocketIO's own managers.
+    """
+    if not url:
+        return {}
+    if url.startswith(SQLITE_SCHEME):
+        return {'client_manager': SQLiteManager(url, channel=channel, **kwargs)}
+    return {'message_queue': url, 'channel': channel}
@@ -0,0 +1,252 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from flask_caching.backends.base import BaseCache
+
+
+class SQLiteCache(BaseCache):
+    """flask_caching backend shared by every worker process on the host.
+
+    Entries live in one SQLite file (WAL, memory-mapped reads), so a value
+    cached or deleted by one gunicorn worker is seen by all of them. Least
+    recently used entries are evicted once the cache holds more than
+    CACHE_THRESHOLD entries or CACHE_MAX_BYTES of pickled values; triggers
+    keep the running totals so checking the limits is a single-row read.
+    get_or_set() takes a per-key lock so only one process rebuilds a
+    missing value while the others wait for it.
+
+    Select it with CACHE_TYPE = 'cache_backend.SQLiteCache'.
+    """
+
+    # Reads refresh last_used at most this often, to keep hits read-only
+    touch_interval = 1.0
+
+    def __init__(self, path, default_timeout=300, threshold=10000, max_bytes=64 * 1024 * 1024,
+                 key_prefix='', ignore_delete_many_errors=False):
+        super().__init__(default_timeout=default_timeout, ignore_delete_many_errors=ignore_delete_many_errors)
+        self.path = path
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.key_prefix = key_prefix
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'builds': 0, 'lock_waits': 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL, last_used REAL NOT NULL);
+                CREATE INDEX IF NOT EXISTS ix_entries_last_used ON entries (last_used);
+                CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 1),
+                    entries INTEGER NOT NULL, bytes INTEGER NOT NULL);
+                INSERT OR IGNORE INTO totals (id, entries, bytes) VALUES (1, 0, 0);
+                CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, expires_at REAL NOT NULL);
+                CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+                    UPDATE totals SET entries = entries + 1, bytes = bytes + NEW.size; END;
+                CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+                    UPDATE totals SET bytes = bytes + NEW.size - OLD.size; END;
+                CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+                    UPDATE totals SET entries = entries - 1, bytes = bytes - OLD.size; END;
+            ''')
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            path=config.get('CACHE_SQLITE_PATH') or os.path.join(app.instance_path, 'cache.db'),
+            threshold=config['CACHE_THRESHOLD'],
+            max_bytes=config.get('CACHE_MAX_BYTES', 64 * 1024 * 1024),
+            key_prefix=config.get('CACHE_KEY_PREFIX') or ''
+        )
+        return cls(*args, **kwargs)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA mmap_size={int(self.max_bytes * 2)}')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def _expires_at(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else 0
+
+    def _lookup(self, key):
+        """Return (found, value) for an already-prefixed key."""
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT value, expires_at, last_used FROM entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or (row[1] and row[1] <= now):
+            self._count('misses')
+            return False, None
+        if row[2] < now - self.touch_interval:
+            conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (now, key))
+        self._count('hits')
+        return True, pickle.loads(row[0])
+
+    def _evict(self, conn):
+        entries, size = conn.execute('SELECT entries, bytes FROM totals').fetchone()
+        if entries <= self.threshold and size <= self.max_bytes:
+            return
+        conn.execute('DELETE FROM entries WHERE expires_at != 0 AND expires_at <= ?', (time.time(),))
+        # Keep the most recently used entries that fit both limits
+        conn.execute('''
+            DELETE FROM entries WHERE key IN (
+                SELECT key FROM (
+                    SELECT key,
+                           ROW_NUMBER() OVER (ORDER BY last_used DESC) AS position,
+                           SUM(size) OVER (ORDER BY last_used DESC ROWS UNBOUNDED PRECEDING) AS running_bytes
+                    FROM entries
+                ) WHERE position > ? OR running_bytes > ?
+            )
+        ''', (self.threshold, self.max_bytes))
+
+    def _store(self, key, value, timeout, only_if_missing=False):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if only_if_missing:
+                row = conn.execute('SELECT expires_at FROM entries WHERE key = ?', (key,)).fetchone()
+                if row is not None and not (row[0] and row[0] <= now):
+                    conn.execute('COMMIT')
+                    return False
+            conn.execute(
+                'INSERT INTO entries (key, value, size, expires_at, last_used) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+                'expires_at = excluded.expires_at, last_used = excluded.last_used',
+                (key, data, len(data), self._expires_at(timeout), now)
+            )
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return True
+
+    def get(self, key):
+        return self._lookup(self.key_prefix + key)[1]
+
+    def has(self, key):
+        return self._lookup(self.key_prefix + key)[0]
+
+    def set(self, key, value, timeout=None):
+        return self._store(self.key_prefix + key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        return self._store(self.key_prefix + key, value, timeout, only_if_missing=True)
+
+    def delete(self, key):
+        cursor = self._connect().execute('DELETE FROM entries WHERE key = ?', (self.key_prefix + key,))
+        return cursor.rowcount > 0
+
+    def delete_many(self, *keys):
+        if not keys:
+            return []
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany('DELETE FROM entries WHERE key = ?', [(self.key_prefix + key,) for key in keys])
+        conn.execute('COMMIT')
+        return list(keys)
+
+    def clear(self):
+        self._connect().execute('DELETE FROM entries')
+        return True
+
+    def inc(self, key, delta=1):
+        key = self.key_prefix + key
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            found, value = self._lookup(key)
+            value = (value if found else 0) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            conn.execute(
+                'INSERT INTO entries (key, value, size, expires_at, last_used) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+                'last_used = excluded.last_used',
+                (key, data, len(data), self._expires_at(None), time.time())
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+    def dec(self, key, delta=1):
+        return self.inc(key, -delta)
+
+    def get_or_set(self, key, build, timeout=None, lock_timeout=10.0, poll_interval=0.02):
+        """Return the cached value for key, calling build() to fill it on a miss.
+
+        Concurrent misses for the same key, in any process, wait for the one
+        caller holding the key's lock instead of all rebuilding it. None is
+        never cached. If the lock holder takes longer than lock_timeout the
+        waiters build the value themselves.
+        """
+        full_key = self.key_prefix + key
+        found, value = self._lookup(full_key)
+        if found:
+            return value
+
+        conn = self._connect()
+        deadline = time.monotonic() + lock_timeout
+        while True:
+            now = time.time()
+            conn.execute('DELETE FROM locks WHERE key = ? AND expires_at <= ?', (full_key, now))
+            acquired = conn.execute(
+                'INSERT OR IGNORE INTO locks (key, expires_at) VALUES (?, ?)', (full_key, now + lock_timeout)
+            ).rowcount == 1
+            if acquired:
+                try:
+                    # Someone may have filled it between our miss and the lock
+                    found, value = self._lookup(full_key)
+                    if found:
+                        return value
+                    self._count('builds')
+                    value = build()
+                    if value is not None:
+                        self._store(full_key, value, timeout)
+                    return value
+                finally:
+                    conn.execute('DELETE FROM locks WHERE key = ?', (full_key,))
+
+            self._count('lock_waits')
+            time.sleep(poll_interval)
+            found, value = self._lookup(full_key)
+            if found:
+                return value
+            if time.monotonic() >= deadline:
+                self._count('builds')
+                return build()
+
+    def stats(self):
+        entries, size = self._connect().execute('SELECT entries, bytes FROM totals').fetchone()
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats.update(
+            hit_rate=stats['hits'] / lookups if lookups else 0.0,
+            entries=entries,
+            bytes=size,
+            threshold=self.threshold,
+            max_bytes=self.max_bytes
+        )
+        return stats
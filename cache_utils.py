@@ -3,8 +3,22 @@ from flask_caching import Cache
 
 
 cache = Cache(config={
-    'CACHE_TYPE': 'simple',
+    'CACHE_TYPE': 'cache_backend.SQLiteCache',  # Shared by all worker processes, see cache_backend.py
     'CACHE_DEFAULT_TIMEOUT': 300,  # Cache timeout in seconds (5 minutes)
-    'CACHE_THRESHOLD': 1000,  # Maximum number of items to keep in the cache
+    'CACHE_THRESHOLD': 10000,  # Maximum number of items to keep in the cache
+    'CACHE_MAX_BYTES': 64 * 1024 * 1024,  # Maximum size of the cached values
     'CACHE_KEY_PREFIX': 'my_app_cache_'  # Prefix for cache keys
 })
+
+
+def get_or_set(key, build, timeout=None):
+    """Return the cached value for key, calling build() once across workers on a miss."""
+    backend = cache.cache
+    if hasattr(backend, 'get_or_set'):
+        return backend.get_or_set(key, build, timeout=timeout)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        if value is not None:
+            cache.set(key, value, timeout=timeout)
+    return value
@@ -0,0 +1,192 @@
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import joinedload
+
+from activity import retract_activity
+from media import media_url
+from models import ConversationSummary, Message, User, db
+from pagination import before_cursor, encode_cursor
+
+MESSAGES_PAGE_SIZE = 20
+MAX_MESSAGES_PAGE_SIZE = 100
+INBOX_PAGE_SIZE = 20
+USER_SEARCH_LIMIT = 10
+
+
+# A conversation is addressed by its (lower user id, higher user id) pair.
+# These expressions must match ix_message_conversation exactly for SQLite
+# to use the index.
+def conversation_low():
+    return func.min(Message.sender_id, Message.recipient_id)
+
+
+def conversation_high():
+    return func.max(Message.sender_id, Message.recipient_id)
+
+
+def conversation_filter(user_id, other_user_id):
+    low, high = sorted((user_id, other_user_id))
+    return (conversation_low() == low) & (conversation_high() == high)
+
+
+def get_conversation_page(user_id, other_user_id, before=None, per_page=MESSAGES_PAGE_SIZE):
+    """Return the newest messages older than `before`, oldest first, and the cursor for the next older page."""
+    per_page = max(1, min(per_page, MAX_MESSAGES_PAGE_SIZE))
+
+    query = db.session.query(Message, User).join(User, Message.sender_id == User.id).filter(
+        conversation_filter(user_id, other_user_id)
+    )
+    if before:
+        query = query.filter(before_cursor(Message.timestamp, Message.id, before))
+    rows = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    next_before = None
+    if has_more:
+        oldest = rows[-1][0]
+        next_before = encode_cursor(oldest.timestamp, oldest.id)
+    # Walked newest-first; displayed oldest-first
+    rows.reverse()
+    return rows, next_before
+
+
+def get_latest_message(user_id, other_user_id):
+    return Message.query.filter(conversation_filter(user_id, other_user_id)).order_by(
+        Message.timestamp.desc(), Message.id.desc()
+    ).first()
+
+
+def delete_conversation(user_id, other_user_id):
+    ConversationSummary.query.filter(
+        ((ConversationSummary.user_id == user_id) & (ConversationSummary.other_user_id == other_user_id)) |
+        ((ConversationSummary.user_id == other_user_id) & (ConversationSummary.other_user_id == user_id))
+    ).delete(synchronize_session=False)
+    removed = db.session.execute(
+        Message.__table__.delete().where(conversation_filter(user_id, other_user_id))
+        .returning(Message.sender_id, Message.timestamp)
+    ).all()
+    retract_activity('messages', removed)
+    return len(removed)
+
+
+def _upsert_summary(user_id, other_user_id, message, unread_delta):
+    stmt = insert(ConversationSummary).values(
+        user_id=user_id,
+        other_user_id=other_user_id,
+        last_message_id=message.id,
+        last_message_at=message.timestamp,
+        unread_count=unread_delta
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'other_user_id'],
+        set_={
+            'last_message_id': stmt.excluded.last_message_id,
+            'last_message_at': stmt.excluded.last_message_at,
+            'unread_count': ConversationSummary.unread_count + unread_delta
+        }
+    )
+    db.session.execute(stmt)
+
+
+def record_message(message):
+    """Update both participants' inbox entries for a newly flushed message. Callers commit."""
+    _upsert_summary(message.sender_id, message.recipient_id, message, 0)
+    if message.recipient_id != message.sender_id:
+        _upsert_summary(message.recipient_id, message.sender_id, message, 1)
+
+
+def mark_conversation_read(user_id, other_user_id):
+    return ConversationSummary.query.filter_by(user_id=user_id, other_user_id=other_user_id).filter(
+        ConversationSummary.unread_count != 0
+    ).update({ConversationSummary.unread_count: 0}, synchronize_session=False)
+
+
+def mark_messages_read(user_id, other_user_id, up_to_id, read_at):
+    """Mark everything other_user_id sent user_id up to and including up_to_id as read. Callers commit.
+
+    Both statements only touch unread rows through ix_message_unread. Returns
+    the number of messages that became read.
+    """
+    unread = (Message.recipient_id == user_id) & (Message.sender_id == other_user_id) & Message.read_at.is_(None)
+    marked = Message.query.filter(unread, Message.id <= up_to_id).update(
+        {Message.read_at: read_at}, synchronize_session=False
+    )
+    if marked:
+        still_unread = select(func.count()).where(unread).scalar_subquery()
+        ConversationSummary.query.filter_by(user_id=user_id, other_user_id=other_user_id).update(
+            {ConversationSummary.unread_count: still_unread}, synchronize_session=False
+        )
+    return marked
+
+
+def get_inbox_page(user_id, cursor=None, per_page=INBOX_PAGE_SIZE):
+    """Return the user's conversations, most recently active first, and the cursor for the next page."""
+    per_page = max(1, min(per_page, MAX_MESSAGES_PAGE_SIZE))
+
+    query = ConversationSummary.query.options(
+        joinedload(ConversationSummary.other_user),
+        joinedload(ConversationSummary.last_message)
+    ).filter(ConversationSummary.user_id == user_id)
+    if cursor:
+        query = query.filter(before_cursor(ConversationSummary.last_message_at, ConversationSummary.other_user_id, cursor))
+    rows = query.order_by(
+        ConversationSummary.last_message_at.desc(), ConversationSummary.other_user_id.desc()
+    ).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.last_message_at, last.other_user_id)
+    return rows, next_cursor
+
+
+def search_users(query_text, exclude_user_id=None, limit=USER_SEARCH_LIMIT):
+    # A half-open range on username can walk the unique username index,
+    # unlike LIKE 'x%' under SQLite's default case-insensitive LIKE
+    prefix = query_text.strip()
+    if not prefix:
+        return []
+    query = User.query.filter(User.username >= prefix, User.username < prefix + '\U0010ffff')
+    if exclude_user_id is not None:
+        query = query.filter(User.id != exclude_user_id)
+    return query.order_by(User.username).limit(limit).all()
+
+
+def serialize_summary(summary):
+    last_message = summary.last_message
+    return {
+        'user_id': summary.other_user.id,
+        'username': summary.other_user.username,
+        'profile_picture': summary.other_user.profile_picture,
+        'profile_picture_url': media_url(summary.other_user.profile_picture, 96),
+        'last_message': last_message.content if last_message else None,
+        'last_message_sender_id': last_message.sender_id if last_message else None,
+        'last_message_at': summary.last_message_at.isoformat(),
+        'unread_count': summary.unread_count
+    }
+
+
+def serialize_user(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'profile_picture': user.profile_picture,
+        'profile_picture_url': media_url(user.profile_picture, 96)
+    }
+
+
+def serialize_message(message, sender):
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'recipient_id': message.recipient_id,
+        'content': message.content,
+        'media_url': message.media_url,
+        'timestamp': message.timestamp.isoformat(),
+        'read_at': message.read_at.isoformat() if message.read_at else None,
+        'sender_username': sender.username,
+        'sender_profile_picture': sender.profile_picture
+    }
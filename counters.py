@@ -0,0 +1,88 @@
+from sqlalchemy import func, select
+
+from models import Comment, Like, Post, User, db, followers
+
+
+# Counters are bumped with a single UPDATE ... SET x = x + n so concurrent
+# requests never lose increments. Callers commit.
+def bump_like_count(post_id, delta):
+    Post.query.filter_by(id=post_id).update(
+        {Post.like_count: Post.like_count + delta}, synchronize_session=False
+    )
+
+
+def bump_comment_count(post_id, delta):
+    Post.query.filter_by(id=post_id).update(
+        {Post.comment_count: Post.comment_count + delta}, synchronize_session=False
+    )
+
+
+def bump_follow_counts(follower_id, followed_id, delta):
+    User.query.filter_by(id=follower_id).update(
+        {User.following_count: User.following_count + delta}, synchronize_session=False
+    )
+    User.query.filter_by(id=followed_id).update(
+        {User.followers_count: User.followers_count + delta}, synchronize_session=False
+    )
+
+
+def _actual_like_count():
+    return select(func.count()).where(Like.post_id == Post.id).scalar_subquery()
+
+
+def _actual_comment_count():
+    return select(func.count(Comment.id)).where(Comment.post_id == Post.id).scalar_subquery()
+
+
+def find_counter_drift():
+    """Return (post_id, like_count, actual_likes, comment_count, actual_comments) for every out-of-sync post."""
+    actual_likes = _actual_like_count()
+    actual_comments = _actual_comment_count()
+    return db.session.query(
+        Post.id, Post.like_count, actual_likes, Post.comment_count, actual_comments
+    ).filter(
+        (Post.like_count != actual_likes) | (Post.comment_count != actual_comments)
+    ).order_by(Post.id).all()
+
+
+def reconcile_post_counters(fix=True):
+    drift = find_counter_drift()
+    if fix and drift:
+        drifted_ids = [row[0] for row in drift]
+        Post.query.filter(Post.id.in_(drifted_ids)).update({
+            Post.like_count: _actual_like_count(),
+            Post.comment_count: _actual_comment_count()
+        }, synchronize_session=False)
+        db.session.commit()
+    return drift
+
+
+def _actual_followers_count():
+    return select(func.count()).where(followers.c.followed_id == User.id).scalar_subquery()
+
+
+def _actual_following_count():
+    return select(func.count()).where(followers.c.follower_id == User.id).scalar_subquery()
+
+
+def find_follow_counter_drift():
+    """Return (user_id, followers_count, actual_followers, following_count, actual_following) for every out-of-sync user."""
+    actual_followers = _actual_followers_count()
+    actual_following = _actual_following_count()
+    return db.session.query(
+        User.id, User.followers_count, actual_followers, User.following_count, actual_following
+    ).filter(
+        (User.followers_count != actual_followers) | (User.following_count != actual_following)
+    ).order_by(User.id).all()
+
+
+def reconcile_follow_counters(fix=True):
+    drift = find_follow_counter_drift()
+    if fix and drift:
+        drifted_ids = [row[0] for row in drift]
+        User.query.filter(User.id.in_(drifted_ids)).update({
+            User.followers_count: _actual_followers_count(),
+            User.following_count: _actual_following_count()
+        }, synchronize_session=False)
+        db.session.commit()
+    return drift
@@ -0,0 +1,164 @@
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from activity import record_activity
+from conversations import mark_messages_read, record_message, serialize_message
+from models import Message, User, db
+
+logger = logging.getLogger(__name__)
+
+
+class MessageDelivery:
+    """The one path every chat message takes.
+
+    send() persists the message and its inbox summaries in one commit, then
+    emits 'new_message' to both participants' rooms, so nobody has to reload
+    the page to see it.
+
+    Receipts are collected for MESSAGE_ACK_FLUSH_MS before touching the
+    database. Delivery acks are checked in one query per acknowledging user
+    and reported to each sender as one 'message_status_update' listing every
+    id. Read receipts are a high-water mark ("read everything you sent me up
+    to id X"): marks for the same conversation collapse to the highest id,
+    which is written in one UPDATE and announced in one status event.
+    """
+
+    def __init__(self, app=None, socketio=None):
+        self.app = None
+        self.socketio = None
+        self.flush_interval = 0.1
+        self._queue = queue.Queue()
+        self._collector = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        app.config.setdefault('MESSAGE_ACK_FLUSH_MS', 100)
+        self.app = app
+        self.socketio = socketio
+        self.flush_interval = app.config['MESSAGE_ACK_FLUSH_MS'] / 1000.0
+        app.extensions['message_delivery'] = self
+
+    def send(self, sender, recipient_id, content, media_url=None):
+        """Persist and push a message. Returns (message_data, error)."""
+        if not content or not content.strip():
+            return None, "Message content cannot be empty."
+        if db.session.get(User, recipient_id) is None:
+            return None, "Recipient not found."
+
+        try:
+            message = Message(
+                sender_id=sender.id,
+                recipient_id=recipient_id,
+                content=content,
+                media_url=media_url,
+                timestamp=datetime.utcnow()
+            )
+            db.session.add(message)
+            db.session.flush()
+            record_message(message)
+            record_activity(sender.id, 'messages', message.timestamp)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return None, f"An error occurred: {str(e)}"
+
+        message_data = serialize_message(message, sender)
+        self.socketio.emit('new_message', message_data, room=str(recipient_id))
+        if recipient_id != sender.id:
+            self.socketio.emit('new_message', message_data, room=str(sender.id))
+        return message_data, None
+
+    def acknowledge_delivered(self, user_id, message_ids):
+        """Queue `user_id`'s delivery ack of message_ids; it reaches the senders on the next flush."""
+        message_ids = [int(message_id) for message_id in message_ids]
+        if message_ids:
+            self._ensure_collector()
+            self._queue.put(('delivered', user_id, message_ids))
+
+    def mark_read(self, user_id, other_user_id, up_to_id):
+        """Queue `user_id` having read other_user_id's messages up to and including up_to_id."""
+        self._ensure_collector()
+        self._queue.put(('read', user_id, (int(other_user_id), int(up_to_id))))
+
+    def _ensure_collector(self):
+        if self._collector is None:
+            with self._lock:
+                if self._collector is None:
+                    self._collector = threading.Thread(target=self._collect, name='message-acks', daemon=True)
+                    self._collector.start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                with self.app.app_context():
+                    self._flush(batch)
+            except Exception as e:
+                logger.error(f"Failed to deliver {len(batch)} message acks: {str(e)}")
+
+    def _flush(self, batch):
+        delivered = defaultdict(set)
+        read_marks = {}
+        for status, user_id, payload in batch:
+            if status == 'delivered':
+                delivered[user_id].update(payload)
+            else:
+                other_user_id, up_to_id = payload
+                key = (user_id, other_user_id)
+                read_marks[key] = max(up_to_id, read_marks.get(key, 0))
+
+        if read_marks:
+            self._flush_read(read_marks)
+        if delivered:
+            self._flush_delivered(delivered)
+
+    def _flush_read(self, read_marks):
+        now = datetime.utcnow()
+        marked = {}
+        for (user_id, other_user_id), up_to_id in read_marks.items():
+            if mark_messages_read(user_id, other_user_id, up_to_id, now):
+                marked[(user_id, other_user_id)] = up_to_id
+        db.session.commit()
+
+        for (user_id, other_user_id), up_to_id in marked.items():
+            self.socketio.emit('message_status_update', {
+                'status': 'read',
+                'recipient_id': user_id,
+                'up_to_id': up_to_id,
+                'read_at': now.isoformat()
+            }, room=str(other_user_id))
+
+    def _flush_delivered(self, delivered):
+        updates = defaultdict(set)
+        for user_id, message_ids in delivered.items():
+            # Only the recipient of a message can acknowledge it
+            rows = db.session.query(Message.id, Message.sender_id).filter(
+                Message.id.in_(message_ids), Message.recipient_id == user_id
+            ).all()
+            for message_id, sender_id in rows:
+                updates[(sender_id, user_id)].add(message_id)
+
+        for (sender_id, user_id), message_ids in updates.items():
+            self.socketio.emit('message_status_update', {
+                'status': 'delivered',
+                'recipient_id': user_id,
+                'message_ids': sorted(message_ids)
+            }, room=str(sender_id))
+
+
+message_delivery = MessageDelivery()
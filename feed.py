@@ -0,0 +1,58 @@
+from sqlalchemy.orm import joinedload
+
+from likes import liked_post_ids
+from models import Post
+from moderation import POST_PUBLISHED
+from pagination import before_cursor, encode_cursor
+
+FEED_PAGE_SIZE = 20
+MAX_FEED_PAGE_SIZE = 50
+
+
+def get_feed_page(viewer_id, cursor=None, per_page=FEED_PAGE_SIZE):
+    """Return one page of the home feed and the cursor for the next one.
+
+    Uses keyset pagination on (timestamp, id) and loads authors and the
+    viewer's likes in a fixed number of queries, whatever the page size.
+    """
+    per_page = max(1, min(per_page, MAX_FEED_PAGE_SIZE))
+
+    query = Post.query.options(joinedload(Post.author)).filter(Post.status == POST_PUBLISHED)
+    if cursor:
+        query = query.filter(before_cursor(Post.timestamp, Post.id, cursor))
+    # Fetch one extra row to know whether there is a next page
+    posts = query.order_by(Post.timestamp.desc(), Post.id.desc()).limit(per_page + 1).all()
+
+    has_more = len(posts) > per_page
+    posts = posts[:per_page]
+    attach_post_stats(posts, viewer_id)
+
+    next_cursor = encode_cursor(posts[-1].timestamp, posts[-1].id) if has_more else None
+    return posts, next_cursor
+
+
+def attach_post_stats(posts, viewer_id):
+    # Like and comment counts are denormalized onto Post, so only the
+    # viewer's likes need a lookup
+    liked = liked_post_ids(viewer_id, [post.id for post in posts])
+    for post in posts:
+        post.liked_by_me = post.id in liked
+    return posts
+
+
+def serialize_post(post):
+    return {
+        'id': post.id,
+        'content': post.content,
+        'content_html': post.content_html,
+        'media_url': post.media_url,
+        'timestamp': post.timestamp.isoformat(),
+        'author': {
+            'id': post.author.id,
+            'username': post.author.username,
+            'profile_picture': post.author.profile_picture
+        },
+        'like_count': post.like_count,
+        'comment_count': post.comment_count,
+        'liked_by_me': post.liked_by_me
+    }
@@ -0,0 +1,66 @@
+from sqlalchemy import exists, select
+from sqlalchemy.dialects.sqlite import insert
+
+from counters import bump_follow_counts
+from models import User, db, followers
+
+
+# Like likes.py: every follow/unfollow is one statement against the
+# (follower_id, followed_id) key, and the counters on both users are only
+# bumped when the row count says something changed. Callers commit.
+def follow_user(follower_id, followed_id):
+    """Follow followed_id. Returns False if already following (or following yourself)."""
+    if follower_id == followed_id:
+        return False
+    stmt = insert(followers).values(follower_id=follower_id, followed_id=followed_id).on_conflict_do_nothing()
+    if db.session.execute(stmt).rowcount:
+        bump_follow_counts(follower_id, followed_id, 1)
+        return True
+    return False
+
+
+def unfollow_user(follower_id, followed_id):
+    stmt = followers.delete().where(followers.c.follower_id == follower_id, followers.c.followed_id == followed_id)
+    if db.session.execute(stmt).rowcount:
+        bump_follow_counts(follower_id, followed_id, -1)
+        return True
+    return False
+
+
+def is_following(follower_id, followed_id):
+    # A primary key probe, no COUNT(*)
+    return db.session.query(exists().where(
+        (followers.c.follower_id == follower_id) & (followers.c.followed_id == followed_id)
+    )).scalar()
+
+
+def is_following_many(follower_id, user_ids):
+    """Return the subset of user_ids that follower_id follows, in one query."""
+    if follower_id is None or not user_ids:
+        return set()
+    rows = db.session.execute(select(followers.c.followed_id).where(
+        followers.c.follower_id == follower_id,
+        followers.c.followed_id.in_(list(user_ids))
+    ))
+    return {followed_id for followed_id, in rows}
+
+
+def drop_follows(user_id):
+    """Remove every follow edge touching user_id, e.g. before deleting the account.
+
+    Returns the ids of the other users whose counters changed. Callers commit.
+    """
+    followed_ids = select(followers.c.followed_id).where(followers.c.follower_id == user_id)
+    follower_ids = select(followers.c.follower_id).where(followers.c.followed_id == user_id)
+    affected = {row[0] for row in db.session.execute(followed_ids.union(follower_ids))}
+    User.query.filter(User.id.in_(followed_ids)).update(
+        {User.followers_count: User.followers_count - 1}, synchronize_session=False
+    )
+    User.query.filter(User.id.in_(follower_ids)).update(
+        {User.following_count: User.following_count - 1}, synchronize_session=False
+    )
+    db.session.execute(followers.delete().where(
+        (followers.c.follower_id == user_id) | (followers.c.followed_id == user_id)
+    ))
+    affected.discard(user_id)
+    return affected
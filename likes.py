@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from activity import record_activity, retract_activity
+from counters import bump_like_count
+from models import Like, Post, db
+
+
+def _post_author(post_id):
+    return select(Post.user_id).where(Post.id == post_id)
+
+
+# Every toggle is one statement against the (post_id, user_id) key: an
+# INSERT ... ON CONFLICT DO NOTHING to like, a DELETE to unlike. The row
+# count tells us whether anything changed, so the counter is only bumped
+# on a real transition. The author's likes_received in the activity rollup
+# follows on the day the like was made. Callers commit.
+def add_like(post_id, user_id):
+    now = datetime.utcnow()
+    stmt = insert(Like).values(post_id=post_id, user_id=user_id, created_at=now).on_conflict_do_nothing()
+    if db.session.execute(stmt).rowcount:
+        bump_like_count(post_id, 1)
+        record_activity(_post_author(post_id).scalar_subquery(), 'likes_received', now)
+        return True
+    return False
+
+
+def remove_like(post_id, user_id):
+    stmt = Like.__table__.delete().where(
+        Like.post_id == post_id, Like.user_id == user_id
+    ).returning(Like.created_at)
+    removed = db.session.execute(stmt).all()
+    if removed:
+        bump_like_count(post_id, -1)
+        author_id = _post_author(post_id).scalar_subquery()
+        retract_activity('likes_received', [(author_id, created_at) for created_at, in removed])
+        return True
+    return False
+
+
+def toggle_like(post_id, user_id):
+    """Like the post, or unlike it if already liked. Returns the new liked state."""
+    if add_like(post_id, user_id):
+        return True
+    remove_like(post_id, user_id)
+    return False
+
+
+def drop_post_likes(post_id):
+    """Remove every like on a post, e.g. before deleting it. Callers commit."""
+    author_id = db.session.scalar(_post_author(post_id))
+    removed = db.session.execute(Like.__table__.delete().where(Like.post_id == post_id).returning(Like.created_at))
+    retract_activity('likes_received', [(author_id, created_at) for created_at, in removed])
+
+
+def drop_user_likes(user_id):
+    """Remove the user's likes and the likes on the user's posts, e.g. before deleting the account.
+
+    Posts the user had liked lose one from like_count, and their authors the
+    like from likes_received. Returns the ids of the other users whose posts
+    changed. Callers commit.
+    """
+    liked_ids = select(Like.post_id).where(Like.user_id == user_id)
+    own_post_ids = select(Post.id).where(Post.user_id == user_id)
+    given = db.session.execute(
+        select(Post.user_id, Like.created_at).join(Post, Post.id == Like.post_id).where(Like.user_id == user_id)
+    ).all()
+    affected = {author_id for author_id, _ in given}
+    retract_activity('likes_received', [(author_id, when) for author_id, when in given if author_id != user_id])
+    Post.query.filter(Post.id.in_(liked_ids)).update(
+        {Post.like_count: Post.like_count - 1}, synchronize_session=False
+    )
+    db.session.execute(Like.__table__.delete().where(
+        (Like.user_id == user_id) | Like.post_id.in_(own_post_ids)
+    ))
+    affected.discard(user_id)
+    return affected
+
+
+def liked_post_ids(user_id, post_ids):
+    """Return the subset of post_ids the user has liked, in one query."""
+    if user_id is None or not post_ids:
+        return set()
+    rows = db.session.query(Like.post_id).filter(
+        Like.user_id == user_id,
+        Like.post_id.in_(list(post_ids))
+    )
+    return {post_id for post_id, in rows}
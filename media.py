@@ -0,0 +1,199 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+from flask import current_app, request, send_from_directory, url_for
+from sqlalchemy.dialects.sqlite import insert
+
+from cache_utils import cache, get_or_set
+from models import MediaFile, db
+from tasks import task_queue
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: without it uploads are stored but never resized
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (96, 320, 640, 1280)
+# GIFs may be animated and videos can't be resized here; both are served as uploaded
+RESIZABLE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+CHUNK_SIZE = 64 * 1024
+MEDIA_CACHE_TIMEOUT = 3600
+# Fingerprinted media URLs never change content, so browsers may keep them for a year
+MEDIA_MAX_AGE = 365 * 24 * 60 * 60
+# Files whose URL carries no fingerprint are revalidated with their ETag after this long
+MEDIA_UNVERSIONED_MAX_AGE = 60
+
+STORED_NAME = re.compile(r'^([0-9a-f]{64})\.(\w+)$')
+# Originals and their variants: <sha256>.<ext> and <sha256>_<width>.<ext>
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{64}(?:_\d+)?\.\w+$')
+
+
+def upload_folder():
+    return os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+
+
+def variant_filename(filename, width):
+    stem, ext = filename.rsplit('.', 1)
+    return f"{stem}_{width}.{ext}"
+
+
+def media_key(digest):
+    return f"media:{digest}"
+
+
+def save_upload(file):
+    """Store an uploaded FileStorage under the SHA-256 of its content and return the stored name.
+
+    The upload is streamed to a temporary file in the upload folder while it
+    is hashed, then renamed into place, so identical uploads share one file
+    and different files never overwrite each other. Images get their
+    resized variants made in the background, also on a re-upload if the
+    first attempt never recorded them (e.g. it ran out of retries).
+    """
+    ext = file.filename.rsplit('.', 1)[1].lower()
+    folder = upload_folder()
+    os.makedirs(folder, exist_ok=True)
+
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                out.write(chunk)
+        filename = f"{digest.hexdigest()}.{ext}"
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    if ext in RESIZABLE_EXTENSIONS and db.session.get(MediaFile, digest.hexdigest()) is None:
+        generate_variants.delay(filename)
+    return filename
+
+
+def variant_widths(filename):
+    match = STORED_NAME.match(filename or '')
+    if match is None:
+        # Uploads from before content addressing have no variants
+        return []
+
+    def load():
+        media = db.session.get(MediaFile, match.group(1))
+        return media.variant_widths if media is not None else []
+
+    return get_or_set(media_key(match.group(1)), load, timeout=MEDIA_CACHE_TIMEOUT)
+
+
+def media_url(filename, width=None):
+    """URL of the smallest stored copy of an upload at least `width` pixels wide.
+
+    Pass about twice the displayed width so high-density screens stay sharp.
+    Falls back to the original until its variants exist.
+    """
+    if width:
+        fitting = [w for w in variant_widths(filename) if w >= width]
+        if fitting:
+            filename = variant_filename(filename, min(fitting))
+    if CONTENT_ADDRESSED.match(filename):
+        # The name is the fingerprint
+        return url_for('media', filename=filename)
+    return url_for('media', filename=filename, v=file_version(filename))
+
+
+def file_version(filename):
+    """Fingerprint for uploads not named by their content: modification time and size."""
+    try:
+        stat = os.stat(os.path.join(upload_folder(), filename))
+    except OSError:
+        return None
+    return f"{int(stat.st_mtime):x}-{stat.st_size:x}"
+
+
+def send_media(filename):
+    """Serve an upload with a strong ETag, Range support and long-lived caching.
+
+    Content-addressed files are cached for a year as immutable. Other files
+    get the same when the request carries their current ?v= fingerprint, and
+    a short max-age otherwise. send_file answers If-None-Match with 304 and
+    Range with 206. Full responses go through the server's
+    wsgi.file_wrapper (sendfile under gunicorn). Set USE_X_SENDFILE to hand
+    every response, ranges included, to the front-end server.
+    """
+    if CONTENT_ADDRESSED.match(filename):
+        etag = filename.rsplit('.', 1)[0]
+        versioned = True
+    else:
+        etag = file_version(filename)
+        versioned = etag is not None and request.args.get('v') == etag
+
+    response = send_from_directory(
+        upload_folder(), filename,
+        etag=etag or True,
+        max_age=MEDIA_MAX_AGE if versioned else MEDIA_UNVERSIONED_MAX_AGE,
+        conditional=True
+    )
+    response.cache_control.public = True
+    if versioned:
+        response.cache_control.immutable = True
+    return response
+
+
+def _save_image(image, path, ext):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.variant-')
+    os.close(fd)
+    try:
+        if ext in ('jpg', 'jpeg'):
+            image.convert('RGB').save(temp_path, 'JPEG', quality=85, optimize=True, progressive=True)
+        else:
+            image.save(temp_path, 'PNG', optimize=True)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+@task_queue.task()
+def generate_variants(filename):
+    if Image is None:
+        logger.warning(f"Pillow is not installed; not resizing {filename}")
+        return
+    digest, ext = STORED_NAME.match(filename).groups()
+    path = os.path.join(upload_folder(), filename)
+
+    widths = []
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original)
+        width, height = image.size
+        for target in VARIANT_WIDTHS:
+            if target >= width:
+                break
+            size = (target, max(1, round(height * target / width)))
+            # reducing_gap shrinks by whole factors first, which is much faster on big photos
+            resized = image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+            _save_image(resized, os.path.join(upload_folder(), variant_filename(filename, target)), ext)
+            widths.append(target)
+
+    stmt = insert(MediaFile).values(
+        hash=digest, filename=filename, size=os.path.getsize(path),
+        width=width, height=height, variants=','.join(map(str, widths))
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MediaFile.hash],
+        set_={'width': stmt.excluded.width, 'height': stmt.excluded.height, 'variants': stmt.excluded.variants}
+    )
+    db.session.execute(stmt)
+    db.session.commit()
+    cache.delete(media_key(digest))
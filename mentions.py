@@ -0,0 +1,43 @@
+import re
+
+from flask import url_for
+from markupsafe import escape
+
+from models import User, db
+
+MENTION_PATTERN = re.compile(r'@(\w+)')
+
+
+def mentioned_usernames(text):
+    return sorted(set(MENTION_PATTERN.findall(text or '')))
+
+
+def existing_usernames(usernames):
+    """Return the subset of usernames that belong to a user, in one query."""
+    if not usernames:
+        return set()
+    rows = db.session.query(User.username).filter(User.username.in_(list(usernames)))
+    return {username for username, in rows}
+
+
+def link_mentions(text, known=None):
+    """Render post text as HTML once, at write time, for Post.content_html.
+
+    The text is escaped and every @mention of an existing user becomes a
+    link to their profile; mentions of unknown names stay plain text. Needs
+    a request context (or SERVER_NAME) for url_for. Pass `known` to reuse
+    one username lookup across many posts.
+    """
+    if known is None:
+        known = existing_usernames(mentioned_usernames(text))
+    # Escaping leaves '@' and word characters alone, so the pattern still matches
+    escaped = str(escape(text or ''))
+
+    def link(match):
+        username = match.group(1)
+        if username not in known:
+            return match.group(0)
+        href = url_for('prof.user_profile', username=username)
+        return f'<a href="{href}" class="text-blue-500 hover:underline">@{username}</a>'
+
+    return MENTION_PATTERN.sub(link, escaped)
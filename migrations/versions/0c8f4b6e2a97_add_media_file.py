@@ -0,0 +1,34 @@
+"""Add media_file table for content-addressed uploads and their variants
+
+Revision ID: 0c8f4b6e2a97
+Revises: e4c9a7b2d315
+Create Date: 2026-10-18 21:36:07.184529
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c8f4b6e2a97'
+down_revision = 'e4c9a7b2d315'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'media_file',
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.Column('filename', sa.String(length=120), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('width', sa.Integer(), nullable=True),
+        sa.Column('height', sa.Integer(), nullable=True),
+        sa.Column('variants', sa.String(length=64), nullable=False, server_default=''),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('hash')
+    )
+
+
+def downgrade():
+    op.drop_table('media_file')
@@ -0,0 +1,35 @@
+"""Add notification_actor table so grouped notifications count distinct actors
+
+Revision ID: 5a1d3f7c9e24
+Revises: 0c8f4b6e2a97
+Create Date: 2026-10-19 09:14:38.502716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a1d3f7c9e24'
+down_revision = '0c8f4b6e2a97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'notification_actor',
+        sa.Column('notification_id', sa.Integer(), sa.ForeignKey('notification.id'), nullable=False),
+        sa.Column('actor_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.PrimaryKeyConstraint('notification_id', 'actor_id')
+    )
+
+    # Only the latest actor of each existing row is known; its count stays as it was
+    op.execute(
+        'INSERT INTO notification_actor (notification_id, actor_id) '
+        'SELECT id, actor_id FROM notification WHERE actor_id IS NOT NULL'
+    )
+
+
+def downgrade():
+    op.drop_table('notification_actor')
@@ -0,0 +1,27 @@
+"""Add moderation status to Post
+
+Revision ID: 5d7f0b3e9c62
+Revises: c52b9e0f7a34
+Create Date: 2026-10-18 12:40:13.276514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7f0b3e9c62'
+down_revision = 'c52b9e0f7a34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing posts were moderated synchronously, so they are all published
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=32), nullable=False, server_default='published'))
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('status')
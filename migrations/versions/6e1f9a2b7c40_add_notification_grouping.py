@@ -0,0 +1,45 @@
+"""Add activity grouping columns to Notification
+
+Revision ID: 6e1f9a2b7c40
+Revises: d4a8c1f63e27
+Create Date: 2026-10-18 17:12:45.220913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e1f9a2b7c40'
+down_revision = 'd4a8c1f63e27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('kind', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('group_key', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('actor_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('actor_count', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.add_column(sa.Column('post_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_notification_actor_id_user', 'user', ['actor_id'], ['id'])
+        batch_op.create_foreign_key('fk_notification_post_id_post', 'post', ['post_id'], ['id'])
+
+    # At most one unread row per (recipient, group); new activity is upserted into it
+    op.create_index(
+        'ux_notification_unread_group', 'notification', ['user_id', 'group_key'],
+        unique=True, sqlite_where=sa.text('read = 0')
+    )
+
+
+def downgrade():
+    op.drop_index('ux_notification_unread_group', table_name='notification')
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_notification_post_id_post', type_='foreignkey')
+        batch_op.drop_constraint('fk_notification_actor_id_user', type_='foreignkey')
+        batch_op.drop_column('post_id')
+        batch_op.drop_column('actor_count')
+        batch_op.drop_column('actor_id')
+        batch_op.drop_column('group_key')
+        batch_op.drop_column('kind')
@@ -0,0 +1,29 @@
+"""Add (min(user), max(user), timestamp, id) conversation index on Message
+
+Revision ID: 71e3a9d4b2c8
+Revises: 5d7f0b3e9c62
+Create Date: 2026-10-18 14:05:37.662019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '71e3a9d4b2c8'
+down_revision = '5d7f0b3e9c62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_message_conversation',
+        'message',
+        [sa.text('min(sender_id, recipient_id)'), sa.text('max(sender_id, recipient_id)'), 'timestamp', 'id'],
+        unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_message_conversation', table_name='message')
@@ -0,0 +1,35 @@
+"""Add denormalized like_count and comment_count to Post
+
+Revision ID: 8a4e6d2c51f7
+Revises: 3f1c2a7d9b10
+Create Date: 2026-10-18 10:02:41.503117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6d2c51f7'
+down_revision = '3f1c2a7d9b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('like_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from the existing rows; `flask reconcile-counters` re-checks later
+    op.execute(
+        'UPDATE post SET '
+        'like_count = (SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = post.id), '
+        'comment_count = (SELECT COUNT(*) FROM comment WHERE comment.post_id = post.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
+        batch_op.drop_column('like_count')
@@ -0,0 +1,27 @@
+"""Add created_at to post_likes so unlikes can be dated in the activity rollup
+
+Revision ID: 8e2b6c4f1d53
+Revises: 5a1d3f7c9e24
+Create Date: 2026-10-19 10:02:17.934851
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2b6c4f1d53'
+down_revision = '5a1d3f7c9e24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing likes stay undated: they were never counted in likes_received
+    with op.batch_alter_table('post_likes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('post_likes', schema=None) as batch_op:
+        batch_op.drop_column('created_at')
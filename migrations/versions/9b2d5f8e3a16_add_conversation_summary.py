@@ -0,0 +1,50 @@
+"""Add conversation_summary inbox table
+
+Revision ID: 9b2d5f8e3a16
+Revises: 71e3a9d4b2c8
+Create Date: 2026-10-18 15:21:48.930452
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2d5f8e3a16'
+down_revision = '71e3a9d4b2c8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'conversation_summary',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('other_user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), sa.ForeignKey('message.id'), nullable=True),
+        sa.Column('last_message_at', sa.DateTime(), nullable=False),
+        sa.Column('unread_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('user_id', 'other_user_id')
+    )
+    op.create_index(
+        'ix_conversation_summary_inbox', 'conversation_summary',
+        ['user_id', 'last_message_at', 'other_user_id'], unique=False
+    )
+
+    # Build both participants' entries from the existing history; nothing
+    # tracked reads before this, so everything starts out read
+    op.execute(
+        'WITH sides AS ('
+        ' SELECT sender_id AS user_id, recipient_id AS other_user_id, id, timestamp FROM message'
+        ' UNION ALL'
+        ' SELECT recipient_id, sender_id, id, timestamp FROM message WHERE recipient_id != sender_id'
+        ') '
+        'INSERT INTO conversation_summary (user_id, other_user_id, last_message_id, last_message_at, unread_count) '
+        'SELECT user_id, other_user_id, MAX(id), MAX(timestamp), 0 FROM sides '
+        'WHERE timestamp IS NOT NULL GROUP BY user_id, other_user_id'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_conversation_summary_inbox', table_name='conversation_summary')
+    op.drop_table('conversation_summary')
@@ -0,0 +1,31 @@
+"""Replace the Notification user_id index with list and unread-count indexes
+
+Revision ID: a3c7e5d90b18
+Revises: 6e1f9a2b7c40
+Create Date: 2026-10-18 17:58:03.517402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c7e5d90b18'
+down_revision = '6e1f9a2b7c40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.create_index('ix_notification_user_read_timestamp', ['user_id', 'read', 'timestamp'], unique=False)
+        batch_op.create_index('ix_notification_user_timestamp_id', ['user_id', 'timestamp', 'id'], unique=False)
+        # Both new indexes lead with user_id
+        batch_op.drop_index('ix_notification_user_id')
+
+
+def downgrade():
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.create_index('ix_notification_user_id', ['user_id'], unique=False)
+        batch_op.drop_index('ix_notification_user_timestamp_id')
+        batch_op.drop_index('ix_notification_user_read_timestamp')
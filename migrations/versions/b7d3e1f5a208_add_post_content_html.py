@@ -0,0 +1,27 @@
+"""Add content_html to Post for mentions linked at write time
+
+Revision ID: b7d3e1f5a208
+Revises: f2b6d8a41c95
+Create Date: 2026-10-18 20:03:18.905127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3e1f5a208'
+down_revision = 'f2b6d8a41c95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing posts render as plain text until `flask link-mentions` fills this in
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_html', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('content_html')
@@ -0,0 +1,63 @@
+"""Unify likes into post_likes keyed on (post_id, user_id) and drop the like table
+
+Revision ID: c52b9e0f7a34
+Revises: 8a4e6d2c51f7
+Create Date: 2026-10-18 11:27:55.841902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52b9e0f7a34'
+down_revision = '8a4e6d2c51f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rebuild post_likes with post_id leading the primary key
+    op.create_table(
+        'post_likes_new',
+        sa.Column('post_id', sa.Integer(), sa.ForeignKey('post.id'), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.PrimaryKeyConstraint('post_id', 'user_id')
+    )
+    op.execute('INSERT INTO post_likes_new (post_id, user_id) SELECT post_id, user_id FROM post_likes')
+    # Fold in anything that was written to the unused Like model
+    op.execute('INSERT OR IGNORE INTO post_likes_new (post_id, user_id) SELECT post_id, user_id FROM "like"')
+    op.drop_table('post_likes')
+    op.rename_table('post_likes_new', 'post_likes')
+    op.create_index('ix_post_likes_user_id_post_id', 'post_likes', ['user_id', 'post_id'], unique=False)
+
+    with op.batch_alter_table('like', schema=None) as batch_op:
+        batch_op.drop_index('ix_like_user_id')
+        batch_op.drop_index('ix_like_post_id')
+    op.drop_table('like')
+
+    op.execute('UPDATE post SET like_count = (SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = post.id)')
+
+
+def downgrade():
+    op.create_table(
+        'like',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('post_id', sa.Integer(), sa.ForeignKey('post.id'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('like', schema=None) as batch_op:
+        batch_op.create_index('ix_like_post_id', ['post_id'], unique=False)
+        batch_op.create_index('ix_like_user_id', ['user_id'], unique=False)
+
+    op.drop_index('ix_post_likes_user_id_post_id', table_name='post_likes')
+    op.create_table(
+        'post_likes_old',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('post_id', sa.Integer(), sa.ForeignKey('post.id'), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'post_id')
+    )
+    op.execute('INSERT INTO post_likes_old (user_id, post_id) SELECT user_id, post_id FROM post_likes')
+    op.drop_table('post_likes')
+    op.rename_table('post_likes_old', 'post_likes')
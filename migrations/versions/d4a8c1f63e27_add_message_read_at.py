@@ -0,0 +1,44 @@
+"""Add read_at to Message with a partial index over unread messages
+
+Revision ID: d4a8c1f63e27
+Revises: 9b2d5f8e3a16
+Create Date: 2026-10-18 16:02:11.408315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a8c1f63e27'
+down_revision = '9b2d5f8e3a16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('read_at', sa.DateTime(), nullable=True))
+
+    # Read state wasn't tracked before; treat existing history as read, as
+    # the conversation_summary backfill does
+    op.execute('UPDATE message SET read_at = timestamp')
+
+    op.create_index(
+        'ix_message_unread', 'message', ['recipient_id', 'sender_id', 'id'],
+        unique=False, sqlite_where=sa.text('read_at IS NULL')
+    )
+
+
+def downgrade():
+    op.drop_index('ix_message_unread', table_name='message')
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_column('read_at')
+
+    # Batch mode rebuilds the table without expression indexes it can't reflect
+    op.create_index(
+        'ix_message_conversation',
+        'message',
+        [sa.text('min(sender_id, recipient_id)'), sa.text('max(sender_id, recipient_id)'), 'timestamp', 'id'],
+        unique=False
+    )
@@ -0,0 +1,47 @@
+"""Add user_activity_daily rollup table
+
+Revision ID: e4c9a7b2d315
+Revises: b7d3e1f5a208
+Create Date: 2026-10-18 20:41:52.610384
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4c9a7b2d315'
+down_revision = 'b7d3e1f5a208'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_activity_daily',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('posts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('likes_received', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('comments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('messages', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+
+    # Backfill what the source tables can date; likes carry no timestamp, so
+    # likes_received only counts from here on
+    op.execute(
+        'INSERT INTO user_activity_daily (user_id, day, posts, comments, messages) '
+        'SELECT user_id, day, SUM(posts), SUM(comments), SUM(messages) FROM ('
+        "  SELECT user_id, date(timestamp) AS day, 1 AS posts, 0 AS comments, 0 AS messages "
+        "  FROM post WHERE status = 'published' AND timestamp IS NOT NULL"
+        '  UNION ALL'
+        '  SELECT author_id, date(timestamp), 0, 1, 0 FROM comment WHERE timestamp IS NOT NULL'
+        '  UNION ALL'
+        '  SELECT sender_id, date(timestamp), 0, 0, 1 FROM message WHERE timestamp IS NOT NULL'
+        ') GROUP BY user_id, day'
+    )
+
+
+def downgrade():
+    op.drop_table('user_activity_daily')
@@ -0,0 +1,83 @@
+"""Key followers on (follower_id, followed_id), drop the follow table and add follow counters to user
+
+Revision ID: f2b6d8a41c95
+Revises: a3c7e5d90b18
+Create Date: 2026-10-18 19:12:40.228315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6d8a41c95'
+down_revision = 'a3c7e5d90b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'followers_new',
+        sa.Column('follower_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('followed_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.PrimaryKeyConstraint('follower_id', 'followed_id')
+    )
+    # The old table had no key, so collapse duplicate edges while copying
+    op.execute(
+        'INSERT OR IGNORE INTO followers_new (follower_id, followed_id) '
+        'SELECT follower_id, followed_id FROM followers '
+        'WHERE follower_id IS NOT NULL AND followed_id IS NOT NULL AND follower_id != followed_id'
+    )
+    # Fold in anything that was written to the unused Follow model
+    op.execute(
+        'INSERT OR IGNORE INTO followers_new (follower_id, followed_id) '
+        'SELECT follower_id, followed_id FROM follow WHERE follower_id != followed_id'
+    )
+    op.drop_table('followers')
+    op.rename_table('followers_new', 'followers')
+    op.create_index('ix_followers_followed_id_follower_id', 'followers', ['followed_id', 'follower_id'], unique=False)
+
+    with op.batch_alter_table('follow', schema=None) as batch_op:
+        batch_op.drop_index('ix_follow_follower_id')
+        batch_op.drop_index('ix_follow_followed_id')
+    op.drop_table('follow')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('followers_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('following_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from the edges; `flask reconcile-counters` re-checks later
+    op.execute(
+        'UPDATE user SET '
+        'followers_count = (SELECT COUNT(*) FROM followers WHERE followers.followed_id = user.id), '
+        'following_count = (SELECT COUNT(*) FROM followers WHERE followers.follower_id = user.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('following_count')
+        batch_op.drop_column('followers_count')
+
+    op.create_table(
+        'follow',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('follower_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('followed_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('follow', schema=None) as batch_op:
+        batch_op.create_index('ix_follow_followed_id', ['followed_id'], unique=False)
+        batch_op.create_index('ix_follow_follower_id', ['follower_id'], unique=False)
+
+    op.drop_index('ix_followers_followed_id_follower_id', table_name='followers')
+    op.create_table(
+        'followers_old',
+        sa.Column('follower_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=True),
+        sa.Column('followed_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=True)
+    )
+    op.execute('INSERT INTO followers_old (follower_id, followed_id) SELECT follower_id, followed_id FROM followers')
+    op.drop_table('followers')
+    op.rename_table('followers_old', 'followers')
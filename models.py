@@ -1,18 +1,20 @@
 from datetime import timedelta, timezone, datetime
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Table, Column, Integer, ForeignKey
-import pytz
+from sqlalchemy import Table, Column, Integer, ForeignKey, func
 
 # Initialize SQLAlchemy
 db = SQLAlchemy()
 EAT = timezone(timedelta(hours=3))
 
-# Define the followers association table
+# Define the followers association table. The (follower_id, followed_id)
+# primary key answers "does A follow B" and lists who A follows; the reverse
+# index lists A's followers. Writes go through follows.py.
 followers = Table(
     'followers',
     db.Model.metadata,
-    Column('follower_id', db.Integer, db.ForeignKey('user.id')),
-    Column('followed_id', db.Integer, db.ForeignKey('user.id'))
+    Column('follower_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    Column('followed_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    db.Index('ix_followers_followed_id_follower_id', 'followed_id', 'follower_id')
 )
 
 # Define the User model
@@ -25,33 +27,24 @@ class User(UserMixin, db.Model):  # Ensure UserMixin is extended
     password_hash = db.Column(db.String(128), nullable=False)
     profile_picture = db.Column(db.String(120), default='default.jpg')
     bio = db.Column(db.Text)
-    date_joined = db.Column(db.DateTime, default=lambda: datetime.now(pytz.timezone('Africa/Nairobi')))
+    date_joined = db.Column(db.DateTime, default=lambda: datetime.now(EAT))
     posts = db.relationship('Post', backref='author', lazy='dynamic', cascade="all, delete-orphan")
     comments = db.relationship('Comment', backref='author', lazy='dynamic', cascade="all, delete-orphan")
-    
-    # Define the many-to-many relationship for followers
+    # Denormalized counters, kept in step by follows.py (see counters.py)
+    followers_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Read-only view of the follow graph; writes go through follows.py so the counters stay in step
     followed = db.relationship(
         'User',
         secondary=followers,
         primaryjoin=id == followers.c.follower_id,
         secondaryjoin=id == followers.c.followed_id,
-        backref=db.backref('followers', lazy='dynamic'),
-        lazy='dynamic'
+        backref=db.backref('followers', lazy='dynamic', viewonly=True),
+        lazy='dynamic',
+        viewonly=True
     )
 
-    def follow(self, user):
-        if not self.is_following(user):
-            self.followed.append(user)
-            db.session.commit()
-
-    def unfollow(self, user):
-        if self.is_following(user):
-            self.followed.remove(user)
-            db.session.commit()
-
-    def is_following(self, user):
-        return self.followed.filter(followers.c.followed_id == user.id).count() > 0
-
     def _repr_(self):
         return f'<User {self.username}>'
 
@@ -59,29 +52,44 @@ class User(UserMixin, db.Model):  # Ensure UserMixin is extended
 class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
+    # content escaped with @mentions linked, rendered once when the post is written (see mentions.py)
+    content_html = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(EAT))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     media_url = db.Column(db.String(120))
-    likes = db.relationship('User', secondary='post_likes', backref='liked_posts')
+    # Denormalized counters, kept in step by the like/comment endpoints (see counters.py)
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # 'pending_moderation' until the background moderator publishes it (see moderation.py)
+    status = db.Column(db.String(32), nullable=False, default='published', server_default='published')
+    # Read-only view of the likers; writes go through likes.py so like_count stays in step
+    likes = db.relationship('User', secondary='post_likes', backref=db.backref('liked_posts', viewonly=True), viewonly=True)
     comments = db.relationship('Comment', backref='post', lazy='dynamic')
 
-    post_likes = db.Table(
-        'post_likes',
-        db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-        db.Column('post_id', db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    # Keyset pagination of the feed walks (timestamp, id) in descending order
+    __table_args__ = (
+        db.Index('ix_post_timestamp_id', 'timestamp', 'id'),
     )
 
     def _repr_(self):
         return f'<Post {self.id}>'
 
-# Define the Like model
+# Define the Like model, the single store for post likes
 class Like(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
-    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False, index=True)
+    __tablename__ = 'post_likes'
+    # The (post_id, user_id) primary key doubles as the unique index for toggles and counts
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    # UTC; dates the like in the activity rollup. Null on likes from before it was recorded
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Serves "which of these posts has this user liked" lookups
+    __table_args__ = (
+        db.Index('ix_post_likes_user_id_post_id', 'user_id', 'post_id'),
+    )
 
     def _repr_(self):
-        return f'<Like {self.id}>'
+        return f'<Like {self.post_id}:{self.user_id}>'
 
 # Define the Comment model
 class Comment(db.Model):
@@ -99,27 +107,130 @@ class Message(db.Model):
     content = db.Column(db.Text, nullable=False)
     media_url = db.Column(db.String, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    read_at = db.Column(db.DateTime, nullable=True)
     
     sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages')
     recipient = db.relationship('User', foreign_keys=[recipient_id], backref='received_messages')
 
+# Conversation history is read per (lower user id, higher user id) pair,
+# newest first; see conversations.py
+db.Index(
+    'ix_message_conversation',
+    func.min(Message.sender_id, Message.recipient_id),
+    func.max(Message.sender_id, Message.recipient_id),
+    Message.timestamp,
+    Message.id
+)
+# Read receipts only ever look at unread messages, so the index stays small
+db.Index(
+    'ix_message_unread',
+    Message.recipient_id,
+    Message.sender_id,
+    Message.id,
+    sqlite_where=Message.read_at.is_(None)
+)
+
+# Define the ConversationSummary model: one row per (user, other user) inbox entry,
+# maintained on every send (see conversations.record_message)
+class ConversationSummary(db.Model):
+    __tablename__ = 'conversation_summary'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    other_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('message.id'))
+    last_message_at = db.Column(db.DateTime, nullable=False)
+    unread_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    other_user = db.relationship('User', foreign_keys=[other_user_id])
+    last_message = db.relationship('Message', foreign_keys=[last_message_id])
+
+    # The inbox lists a user's conversations most recent first
+    __table_args__ = (
+        db.Index('ix_conversation_summary_inbox', 'user_id', 'last_message_at', 'other_user_id'),
+    )
+
+    def _repr_(self):
+        return f'<ConversationSummary {self.user_id}:{self.other_user_id}>'
+
 # Define the Notification model
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(EAT))
     read = db.Column(db.Boolean, default=False)
+    # Activity notifications (likes, comments, follows, mentions); see
+    # notifications.py. Repeats of the same unread group_key are folded into
+    # one row: actor_id is the latest actor, actor_count how many distinct
+    # actors there were (kept from NotificationActor).
+    kind = db.Column(db.String(20), nullable=True)
+    group_key = db.Column(db.String(64), nullable=True)
+    actor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    actor_count = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=True)
+
+    actor = db.relationship('User', foreign_keys=[actor_id])
+
+    __table_args__ = (
+        db.Index('ux_notification_unread_group', 'user_id', 'group_key', unique=True,
+                 sqlite_where=db.text('read = 0')),
+        # Unread counts and mark-all-read
+        db.Index('ix_notification_user_read_timestamp', 'user_id', 'read', 'timestamp'),
+        # The newest-first notification list
+        db.Index('ix_notification_user_timestamp_id', 'user_id', 'timestamp', 'id'),
+    )
+
+    @property
+    def message(self):
+        if self.actor is None:
+            return self.content
+        others = self.actor_count - 1
+        if others == 0:
+            return f"{self.actor.username} {self.content}"
+        return f"{self.actor.username} and {others} other{'s' if others > 1 else ''} {self.content}"
 
     def _repr_(self):
         return f'<Notification {self.id}>'
 
-# Define the Follow model (if needed for additional tracking)
-class Follow(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    follower_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
-    followed_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
-    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(EAT))
+# Define the NotificationActor model: who is folded into a grouped
+# notification, so the same actor liking twice is counted once
+class NotificationActor(db.Model):
+    __tablename__ = 'notification_actor'
+    notification_id = db.Column(db.Integer, db.ForeignKey('notification.id'), primary_key=True)
+    actor_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+
+    def _repr_(self):
+        return f'<NotificationActor {self.notification_id}:{self.actor_id}>'
+
+# Define the DailyActivity model: per-user, per-day counters bumped on every
+# write (see activity.py), so activity charts never scan the source tables
+class DailyActivity(db.Model):
+    __tablename__ = 'user_activity_daily'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    posts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    likes_received = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comments = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    messages = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def _repr_(self):
+        return f'<DailyActivity {self.user_id}:{self.day}>'
+
+# Define the MediaFile model: one row per stored upload, named by the SHA-256
+# of its content, with the widths of the resized copies made so far (see media.py)
+class MediaFile(db.Model):
+    __tablename__ = 'media_file'
+    hash = db.Column(db.String(64), primary_key=True)
+    filename = db.Column(db.String(120), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    # Comma-separated, ascending, e.g. "96,320,640"
+    variants = db.Column(db.String(64), nullable=False, default='', server_default='')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def variant_widths(self):
+        return [int(width) for width in self.variants.split(',') if width]
 
     def _repr_(self):
-        return f'<Follow {self.id}>'
\ No newline at end of file
+        return f'<MediaFile {self.filename}>'
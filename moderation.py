@@ -0,0 +1,449 @@
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from activity import record_activity
+from models import Post, db
+from notifications import notify_mentions
+
+logger = logging.getLogger(__name__)
+
+POST_PENDING = 'pending_moderation'
+POST_PUBLISHED = 'published'
+POST_REJECTED = 'rejected'
+
+# The user's text goes into every prompt as JSON on a line of its own after
+# one of these labels, so quotes or newlines in a post can't break the prompt
+TEXT_LABEL = 'Text to analyze (JSON string):'
+BATCH_TEXTS_LABEL = 'Texts to analyze (JSON array):'
+
+POST_MODERATION_PROMPT = """
+    Analyze the following text for any violations of community guidelines.
+    If violations are found, provide a friendly explanation and suggest 3 alternative wordings.
+    Make the suggestions fun and engaging.
+    {label} {text}
+
+    Respond in the following JSON format:
+    {{
+        "violates_guidelines": boolean,
+        "explanation": "string",
+        "suggestions": ["string"]
+    }}
+    """
+
+BATCH_MODERATION_PROMPT = """
+    Analyze each of the following texts separately for any violations of community guidelines.
+    For every text that violates them, provide a friendly explanation and suggest 3 alternative wordings.
+    Make the suggestions fun and engaging.
+    {label} {texts}
+
+    Respond with a JSON array containing exactly one object per text, in the same order, in the following format:
+    [
+        {{
+            "index": integer,
+            "violates_guidelines": boolean,
+            "explanation": "string",
+            "suggestions": ["string"]
+        }}
+    ]
+    """
+
+CONTENT_MODERATION_PROMPT = """
+    Analyze the following content for appropriateness on a social media platform. Please take into account common community guidelines which may include but are not limited to: harassment, hate speech, violence, explicit content, misinformation, and spam.
+
+    {label} {text}
+
+    Please provide the following in your response:
+    1. **Violates Guidelines**: Determine if the content violates any common social media community guidelines. Respond with `true` if it violates, otherwise `false`.
+    2. **Explanation**: Provide a brief explanation for your determination. Mention which specific guideline(s) are potentially violated or why the content is considered appropriate.
+    3. **Sentiment Analysis**: Analyze the sentiment of the content and classify it as `positive`, `neutral`, or `negative`. Provide reasoning for the sentiment classification.
+    4. **Suggestions for Improvement**: If the content is borderline inappropriate or has potential issues, suggest specific ways to improve it to make it more suitable for a social media platform.
+
+    Format your response as a JSON object with the following keys:
+    - `"violates_guidelines"`: (boolean) `true` or `false` indicating if the content violates guidelines.
+    - `"explanation"`: (string) A brief explanation of why the content does or does not violate guidelines.
+    - `"sentiment"`: (string) The sentiment analysis result, which can be `positive`, `neutral`, or `negative`.
+    - `"suggestions"`: (array of strings) Suggestions for improving the content if needed.
+
+    Example of a JSON response:
+    {{
+        "violates_guidelines": true,
+        "explanation": "The content contains explicit language which violates our community guidelines on harassment.",
+        "sentiment": "negative",
+        "suggestions": ["Remove explicit language", "Rephrase the content to be more respectful."]
+    }}
+    """
+
+CONTENT_VERDICT_KEYS = ('violates_guidelines', 'explanation', 'sentiment', 'suggestions')
+
+
+def build_post_prompt(text):
+    return POST_MODERATION_PROMPT.format(label=TEXT_LABEL, text=json.dumps(text))
+
+
+def build_batch_prompt(texts):
+    return BATCH_MODERATION_PROMPT.format(label=BATCH_TEXTS_LABEL, texts=json.dumps(texts))
+
+
+def build_content_prompt(text):
+    return CONTENT_MODERATION_PROMPT.format(label=TEXT_LABEL, text=json.dumps(text))
+
+
+def extract_json(response_text):
+    """Parse the first {...} block out of a model response."""
+    json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+    if not json_match:
+        raise ValueError("No valid JSON found in the response")
+    return json.loads(json_match.group(0))
+
+
+def extract_json_array(response_text, expected_length):
+    """Parse the [...] block out of a batched model response, one verdict per input."""
+    json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
+    if not json_match:
+        raise ValueError("No JSON array found in the response")
+    verdicts = json.loads(json_match.group(0))
+    if not isinstance(verdicts, list) or len(verdicts) != expected_length:
+        raise ValueError(f"Expected {expected_length} verdicts in the batched response")
+
+    ordered = [None] * expected_length
+    for position, verdict in enumerate(verdicts):
+        if not isinstance(verdict, dict) or 'violates_guidelines' not in verdict:
+            raise ValueError("Malformed verdict in the batched response")
+        index = verdict.pop('index', position)
+        if not isinstance(index, int) or not 0 <= index < expected_length or ordered[index] is not None:
+            raise ValueError("Verdict indexes in the batched response don't match the input")
+        ordered[index] = verdict
+    return ordered
+
+
+# Model clients only need generate(prompt) -> str, so the pipeline can run
+# against Gemini (ai_client.py) in production and a local fake offline.
+class FakeModelClient:
+    """Offline stand-in for Gemini: flags text containing any banned word.
+
+    Only the user's text after TEXT_LABEL or BATCH_TEXTS_LABEL is scanned,
+    never the instructions around it.
+    """
+
+    def __init__(self, banned_words=('hate', 'kill', 'stupid'), latency=0.0):
+        self.banned_words = tuple(word.lower() for word in banned_words)
+        self.latency = latency
+        self.calls = 0
+
+    def _verdict(self, text):
+        hits = [word for word in self.banned_words if word in text.lower()]
+        return {
+            'violates_guidelines': bool(hits),
+            'explanation': f"Contains flagged language: {', '.join(hits)}." if hits else "Looks good!",
+            'sentiment': 'negative' if hits else 'neutral',
+            'suggestions': [f"Try rephrasing without '{word}'." for word in hits]
+        }
+
+    def generate(self, prompt):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        for line in prompt.splitlines():
+            line = line.strip()
+            if line.startswith(BATCH_TEXTS_LABEL):
+                texts = json.loads(line[len(BATCH_TEXTS_LABEL):])
+                return json.dumps([dict(self._verdict(text), index=i) for i, text in enumerate(texts)])
+            if line.startswith(TEXT_LABEL):
+                return json.dumps(self._verdict(json.loads(line[len(TEXT_LABEL):])))
+        raise ValueError("No text to analyze in the prompt")
+
+
+def check_post_content(client, text):
+    response_text = client.generate(build_post_prompt(text))
+    logger.debug(f"Moderation response text: {response_text}")
+    return extract_json(response_text)
+
+
+def check_post_batch(client, texts):
+    response_text = client.generate(build_batch_prompt(texts))
+    logger.debug(f"Batched moderation response text: {response_text}")
+    return extract_json_array(response_text, len(texts))
+
+
+def check_content(client, text):
+    """Full guideline and sentiment analysis, in the shape moderate_content returns."""
+    response_text = client.generate(build_content_prompt(text)).strip()
+    if not response_text:
+        raise ValueError("Received an empty response from the model")
+
+    moderation_result = extract_json(response_text)
+    if not all(key in moderation_result for key in CONTENT_VERDICT_KEYS):
+        raise ValueError("Moderation result is missing required keys")
+
+    # Check for vulgar language
+    if moderation_result.get("violates_guidelines") and "explicit" in moderation_result.get("explanation", "").lower():
+        moderation_result["suggestions"].append("Please avoid using vulgar language.")
+    return moderation_result
+
+
+class BatchingModerator:
+    """Coalesces concurrent post checks into multi-item prompts.
+
+    Callers block in check(text). A collector thread gathers waiting texts
+    until max_items are queued or max_wait_ms has passed since the first,
+    sends them as one prompt and hands each caller its own verdict. When the
+    batched response can't be parsed, every text in it is retried singly.
+    """
+
+    def __init__(self, client, max_items=8, max_wait_ms=50, max_in_flight=2):
+        self.client = client
+        self.max_items = max_items
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._senders = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='moderation-batch')
+        self._collector = None
+        self._lock = threading.Lock()
+        self._stats = {'items': 0, 'batches': 0, 'llm_calls': 0, 'fallbacks': 0}
+
+    def check(self, text):
+        self._ensure_collector()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
+
+    def _ensure_collector(self):
+        if self._collector is None:
+            with self._lock:
+                if self._collector is None:
+                    self._collector = threading.Thread(target=self._collect, name='moderation-collector', daemon=True)
+                    self._collector.start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._senders.submit(self._send, batch)
+
+    def _send(self, batch):
+        texts = [text for text, _ in batch]
+        self._count(items=len(batch), batches=1)
+        if len(batch) > 1:
+            self._count(llm_calls=1)
+            try:
+                verdicts = check_post_batch(self.client, texts)
+            except Exception as e:
+                logger.warning(f"Batched moderation of {len(batch)} posts failed, retrying singly: {str(e)}")
+                self._count(fallbacks=1)
+            else:
+                for (_, future), verdict in zip(batch, verdicts):
+                    future.set_result(verdict)
+                return
+
+        for text, future in batch:
+            self._count(llm_calls=1)
+            try:
+                future.set_result(check_post_content(self.client, text))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class ModerationPipeline:
+    """Runs post moderation on a background thread pool.
+
+    Posts are written as pending_moderation and handed to submit(); the
+    worker publishes or rejects them and emits 'post_moderated' to the
+    author's Socket.IO room.
+
+    Jobs only live in this process, so a sweeper thread resubmits posts
+    still pending MODERATION_RECOVER_AFTER seconds after they were written,
+    e.g. after a worker restart, every MODERATION_SWEEP_INTERVAL seconds.
+    Posts the model couldn't review (an outage, a bad response) are left
+    pending for the sweeper too; only a verdict rejects a post.
+    A post only leaves pending once, so a post moderated twice is published
+    or rejected once.
+    """
+
+    def __init__(self, app=None, socketio=None, client=None):
+        self.app = None
+        self.socketio = None
+        self.client = None
+        self.batcher = None
+        self.executor = None
+        self.recover_after = 300
+        self.sweep_interval = 60
+        self._sweeper = None
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, socketio, client)
+
+    def init_app(self, app, socketio, client=None):
+        app.config.setdefault('MODERATION_WORKERS', 8)
+        app.config.setdefault('MODERATION_CLIENT', 'gemini')
+        # A batch size of 1 turns micro-batching off
+        app.config.setdefault('MODERATION_BATCH_MAX_ITEMS', 8)
+        app.config.setdefault('MODERATION_BATCH_MAX_WAIT_MS', 50)
+        app.config.setdefault('MODERATION_RECOVER_AFTER', 300)
+        app.config.setdefault('MODERATION_SWEEP_INTERVAL', 60)
+        self.app = app
+        self.recover_after = app.config['MODERATION_RECOVER_AFTER']
+        self.sweep_interval = app.config['MODERATION_SWEEP_INTERVAL']
+        self.socketio = socketio
+        # MODERATION_CLIENT=fake swaps in the offline client regardless of what the app passes
+        if app.config['MODERATION_CLIENT'] == 'fake':
+            self.client = FakeModelClient()
+        else:
+            self.client = client
+        self.batcher = None
+        if app.config['MODERATION_BATCH_MAX_ITEMS'] > 1:
+            self.batcher = BatchingModerator(
+                self.client,
+                max_items=app.config['MODERATION_BATCH_MAX_ITEMS'],
+                max_wait_ms=app.config['MODERATION_BATCH_MAX_WAIT_MS']
+            )
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config['MODERATION_WORKERS'],
+            thread_name_prefix='moderation'
+        )
+        # Like the task queue, the sweeper starts with the first request
+        app.before_request(self.start_sweeper)
+        app.extensions['moderation_pipeline'] = self
+
+    def set_client(self, client):
+        self.client = client
+        if self.batcher is not None:
+            self.batcher.client = client
+
+    def submit(self, post_id, author_id, text):
+        with self._lock:
+            self._in_flight.add(post_id)
+        return self.executor.submit(self._moderate, post_id, author_id, text)
+
+    def recover_stalled(self):
+        """Resubmit posts pending longer than recover_after that this process isn't already moderating."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.recover_after)
+        stalled = db.session.query(Post.id, Post.user_id, Post.content).filter(
+            Post.status == POST_PENDING, Post.timestamp < cutoff
+        ).all()
+        with self._lock:
+            stalled = [post for post in stalled if post.id not in self._in_flight]
+        for post_id, author_id, text in stalled:
+            logger.warning(f"Post {post_id} was left pending moderation; resubmitting")
+            self.submit(post_id, author_id, text)
+        return len(stalled)
+
+    def start_sweeper(self):
+        if self._sweeper is None:
+            with self._lock:
+                if self._sweeper is None:
+                    self._sweeper = threading.Thread(target=self._sweep, name='moderation-sweeper', daemon=True)
+                    self._sweeper.start()
+
+    def _sweep(self):
+        while True:
+            with self.app.app_context():
+                try:
+                    self.recover_stalled()
+                except Exception as e:
+                    logger.error(f"Could not sweep pending posts: {str(e)}", exc_info=True)
+                finally:
+                    db.session.remove()
+            time.sleep(self.sweep_interval)
+
+    def _classify(self, text):
+        if self.batcher is not None:
+            return self.batcher.check(text)
+        return check_post_content(self.client, text)
+
+    def _check(self, text):
+        # Clear-cut posts are settled locally without touching the model
+        prefilter = self.app.extensions.get('moderation_prefilter')
+        if prefilter is not None:
+            verdict = prefilter.classify(text)
+            if verdict is not None:
+                return verdict
+
+        # Reposts of the same text are answered from the shared verdict cache
+        verdict_cache = self.app.extensions.get('verdict_cache')
+        if verdict_cache is None:
+            return self._classify(text)
+        return verdict_cache.get_or_compute('post', text, lambda: self._classify(text))
+
+    def _moderate(self, post_id, author_id, text):
+        try:
+            return self._settle(post_id, author_id, text)
+        finally:
+            with self._lock:
+                self._in_flight.discard(post_id)
+
+    def _settle(self, post_id, author_id, text):
+        with self.app.app_context():
+            try:
+                verdict = self._check(text)
+            except Exception as e:
+                # Still pending, so the sweeper tries again once the model is back
+                logger.error(f"Error moderating post {post_id}, leaving it pending: {str(e)}", exc_info=True)
+                return None
+
+            post = db.session.get(Post, post_id)
+            if post is None:
+                # Deleted while it was waiting for review
+                return None
+
+            if not verdict.get('violates_guidelines', False):
+                status = POST_PUBLISHED
+                result = {'post_id': post_id, 'status': POST_PUBLISHED}
+            else:
+                # Rejected posts stay out of the feed (their row is kept so
+                # ids are never reused); the author gets their text back to
+                # edit and resubmit
+                status = POST_REJECTED
+                result = {
+                    'post_id': post_id,
+                    'status': 'rejected',
+                    'violates_guidelines': True,
+                    'explanation': verdict.get('explanation', 'Your post may violate community guidelines.'),
+                    'suggestions': verdict.get('suggestions', []),
+                    'original_content': text
+                }
+
+            # Only the first worker to settle a post (a recovered one may be
+            # moderated twice) publishes it and tells the author
+            settled = Post.query.filter_by(id=post_id, status=POST_PENDING).update(
+                {Post.status: status}, synchronize_session=False
+            )
+            if not settled:
+                db.session.rollback()
+                return None
+            if status == POST_PUBLISHED:
+                record_activity(post.user_id, 'posts', post.timestamp)
+            db.session.commit()
+            if status == POST_PUBLISHED:
+                notify_mentions(text, author_id, post_id)
+                profile_cache = self.app.extensions.get('profile_cache')
+                if profile_cache is not None:
+                    profile_cache.invalidate(post.author.username)
+
+        self.socketio.emit('post_moderated', result, room=str(author_id))
+        return result
+
+
+moderation_pipeline = ModerationPipeline()
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+def normalize_text(text):
+    # Case, Unicode form and whitespace changes shouldn't buy a new LLM call
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def content_key(kind, text):
+    digest = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+    return f"{kind}:{digest}"
+
+
+class VerdictCache:
+    """Moderation verdicts keyed by a hash of the normalized text.
+
+    Lives in its own SQLite file so every gunicorn worker shares it. Entries
+    expire after MODERATION_CACHE_TTL seconds and the least recently used
+    ones are evicted past MODERATION_CACHE_MAX_ENTRIES. Hit/miss counters are
+    stored alongside so they cover all workers.
+    """
+
+    def __init__(self, app=None):
+        self.path = None
+        self.ttl = None
+        self.max_entries = None
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MODERATION_CACHE_PATH', os.path.join(app.instance_path, 'moderation_cache.db'))
+        app.config.setdefault('MODERATION_CACHE_TTL', 24 * 60 * 60)
+        app.config.setdefault('MODERATION_CACHE_MAX_ENTRIES', 10000)
+        self.path = app.config['MODERATION_CACHE_PATH']
+        self.ttl = app.config['MODERATION_CACHE_TTL']
+        self.max_entries = app.config['MODERATION_CACHE_MAX_ENTRIES']
+        self._local = threading.local()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS verdicts ('
+                'key TEXT PRIMARY KEY, verdict TEXT NOT NULL, '
+                'created_at REAL NOT NULL, last_used REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_verdicts_last_used ON verdicts (last_used)')
+            conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute("INSERT OR IGNORE INTO stats (name, value) VALUES ('hits', 0), ('misses', 0)")
+        app.extensions['verdict_cache'] = self
+
+    def _connect(self):
+        # One connection per thread; the moderation pool calls in from several
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, conn, name):
+        conn.execute('UPDATE stats SET value = value + 1 WHERE name = ?', (name,))
+
+    def get(self, kind, text):
+        key = content_key(kind, text)
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            row = conn.execute(
+                'SELECT verdict FROM verdicts WHERE key = ? AND created_at > ?',
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self._count(conn, 'misses')
+                return None
+            conn.execute('UPDATE verdicts SET last_used = ? WHERE key = ?', (now, key))
+            self._count(conn, 'hits')
+        return json.loads(row[0])
+
+    def set(self, kind, text, verdict):
+        key = content_key(kind, text)
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO verdicts (key, verdict, created_at, last_used) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(verdict), now, now)
+            )
+            conn.execute('DELETE FROM verdicts WHERE created_at <= ?', (now - self.ttl,))
+            # Keep the max_entries most recently used rows
+            conn.execute(
+                'DELETE FROM verdicts WHERE key IN ('
+                'SELECT key FROM verdicts ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def get_or_compute(self, kind, text, compute):
+        verdict = self.get(kind, text)
+        if verdict is None:
+            verdict = compute()
+            self.set(kind, text, verdict)
+        return verdict
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM verdicts')
+            conn.execute('UPDATE stats SET value = 0')
+
+    def stats(self):
+        conn = self._connect()
+        counters = dict(conn.execute('SELECT name, value FROM stats').fetchall())
+        entries = conn.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+        hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl': self.ttl
+        }
+
+
+verdict_cache = VerdictCache()
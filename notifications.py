@@ -0,0 +1,180 @@
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import joinedload
+
+from cache_utils import cache, get_or_set
+from mentions import mentioned_usernames
+from models import EAT, Notification, NotificationActor, User, db
+from pagination import before_cursor, encode_cursor
+from tasks import task_queue
+
+NOTIFICATIONS_PAGE_SIZE = 20
+MAX_NOTIFICATIONS_PAGE_SIZE = 50
+UNREAD_COUNT_TIMEOUT = 60
+
+VERBS = {
+    'like': 'liked your post',
+    'comment': 'commented on your post',
+    'follow': 'started following you',
+    'mention': 'mentioned you in a post',
+}
+
+
+def group_key(kind, post_id=None):
+    return f"{kind}:{post_id}" if post_id is not None else kind
+
+
+def notify(user_id, kind, actor_id, post_id=None):
+    """Queue an activity notification for user_id. Nobody is notified about their own actions."""
+    if user_id != actor_id:
+        deliver_notifications.delay(user_id, kind, actor_id, post_id)
+
+
+def notify_mentions(text, actor_id, post_id):
+    usernames = mentioned_usernames(text)
+    if usernames:
+        deliver_mentions.delay(actor_id, post_id, usernames)
+
+
+def store_notifications(events):
+    """Write (user_id, kind, actor_id, post_id) events in one statement.
+
+    Events are grouped per recipient and group_key first; each group becomes
+    one row, or is folded into the recipient's unread row for that key, so
+    fifty likes on a post leave "X and 49 others liked your post" rather
+    than fifty rows. The actors of each row are kept in notification_actor
+    and actor_count is recounted from there, so an actor who likes, unlikes
+    and likes again still counts once. Callers commit. Returns the ids of
+    the users notified.
+    """
+    groups = OrderedDict()
+    for user_id, kind, actor_id, post_id in events:
+        if user_id == actor_id:
+            continue
+        key = (user_id, group_key(kind, post_id))
+        group = groups.setdefault(key, {'kind': kind, 'post_id': post_id, 'actors': []})
+        if actor_id not in group['actors']:
+            group['actors'].append(actor_id)
+    if not groups:
+        return set()
+
+    now = datetime.now(EAT)
+    rows = [{
+        'user_id': user_id,
+        'group_key': key,
+        'kind': group['kind'],
+        'content': VERBS[group['kind']],
+        'post_id': group['post_id'],
+        'actor_id': group['actors'][-1],
+        'actor_count': len(group['actors']),
+        'timestamp': now,
+        'read': False
+    } for (user_id, key), group in groups.items()]
+
+    stmt = insert(Notification).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Notification.user_id, Notification.group_key],
+        index_where=db.text('read = 0'),
+        set_={
+            'actor_id': stmt.excluded.actor_id,
+            'timestamp': stmt.excluded.timestamp
+        }
+    ).returning(Notification.id, Notification.user_id, Notification.group_key)
+    notification_ids = {(user_id, key): notification_id for notification_id, user_id, key in db.session.execute(stmt)}
+
+    actors = [
+        {'notification_id': notification_ids[key], 'actor_id': actor_id}
+        for key, group in groups.items() for actor_id in group['actors']
+    ]
+    db.session.execute(insert(NotificationActor).values(actors).on_conflict_do_nothing())
+    distinct_actors = select(func.count()).where(
+        NotificationActor.notification_id == Notification.id
+    ).scalar_subquery()
+    Notification.query.filter(Notification.id.in_(notification_ids.values())).update(
+        {Notification.actor_count: distinct_actors}, synchronize_session=False
+    )
+    return {user_id for user_id, _ in groups}
+
+
+def get_notifications_page(user_id, cursor=None, per_page=NOTIFICATIONS_PAGE_SIZE):
+    """Return the user's notifications newer than `cursor`, newest first, and the cursor for the next page."""
+    per_page = max(1, min(per_page, MAX_NOTIFICATIONS_PAGE_SIZE))
+
+    query = Notification.query.options(joinedload(Notification.actor)).filter(Notification.user_id == user_id)
+    if cursor:
+        query = query.filter(before_cursor(Notification.timestamp, Notification.id, cursor))
+    notifications = query.order_by(Notification.timestamp.desc(), Notification.id.desc()).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(notifications) > per_page:
+        notifications = notifications[:per_page]
+        next_cursor = encode_cursor(notifications[-1].timestamp, notifications[-1].id)
+    return notifications, next_cursor
+
+
+def mark_all_read(user_id):
+    """Mark every unread notification read in one UPDATE and commit."""
+    marked = Notification.query.filter_by(user_id=user_id, read=False).update(
+        {Notification.read: True}, synchronize_session=False
+    )
+    db.session.commit()
+    if marked:
+        forget_unread_counts([user_id])
+    return marked
+
+
+def unread_count_key(user_id):
+    return f"notifications_unread_{user_id}"
+
+
+def unread_count(user_id):
+    # The nav badge asks on every page; serve it from the cache, which is
+    # dropped whenever the count changes
+    return get_or_set(
+        unread_count_key(user_id),
+        lambda: Notification.query.filter_by(user_id=user_id, read=False).count(),
+        timeout=UNREAD_COUNT_TIMEOUT
+    )
+
+
+def forget_unread_counts(user_ids):
+    # Only after the change is committed, or a concurrent read re-caches the old count
+    cache.delete_many(*[unread_count_key(user_id) for user_id in user_ids])
+
+
+def serialize_notification(notification):
+    return {
+        'id': notification.id,
+        'kind': notification.kind,
+        'message': notification.message,
+        'post_id': notification.post_id,
+        'actor_id': notification.actor_id,
+        'actor_count': notification.actor_count,
+        'read': notification.read,
+        'timestamp': notification.timestamp.isoformat()
+    }
+
+
+@task_queue.task(batch=True)
+def deliver_notifications(calls):
+    notified = store_notifications(calls)
+    db.session.commit()
+    forget_unread_counts(notified)
+
+
+@task_queue.task(batch=True)
+def deliver_mentions(calls):
+    # One lookup for every username mentioned anywhere in the batch
+    usernames = {username for _, _, names in calls for username in names}
+    user_ids = dict(db.session.query(User.username, User.id).filter(User.username.in_(usernames)).all())
+    notified = store_notifications([
+        (user_ids[username], 'mention', actor_id, post_id)
+        for actor_id, post_id, names in calls
+        for username in names
+        if username in user_ids
+    ])
+    db.session.commit()
+    forget_unread_counts(notified)
@@ -0,0 +1,30 @@
+import base64
+import binascii
+from datetime import datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# Keyset cursors are an opaque "<timestamp>|<id>" pair pointing at the last
+# row already shown; the next page continues strictly after it
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(f"Malformed cursor: {cursor!r}")
+
+
+def before_cursor(timestamp_column, id_column, cursor):
+    """Filter for rows that sort after the cursor in (timestamp, id) descending order."""
+    timestamp, row_id = decode_cursor(cursor)
+    return (timestamp_column < timestamp) | ((timestamp_column == timestamp) & (id_column < row_id))
@@ -0,0 +1,149 @@
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Phrases that are never acceptable; a hit rejects without asking the model
+BLOCKED_TERMS = (
+    'kill yourself', 'kys', 'go die', 'i will kill you', 'send nudes',
+)
+
+# Words that make a post worth a second look; they keep the local tier from accepting
+WATCH_TERMS = (
+    'hate', 'kill', 'die', 'stupid', 'idiot', 'dumb', 'ugly', 'loser', 'attack',
+    'shoot', 'gun', 'bomb', 'nude', 'sex', 'drugs', 'scam', 'free money',
+    'click here', 'crypto', 'giveaway', 'f*ck', 'fuck', 'shit', 'bitch',
+)
+
+TIERS = ('keyword_reject', 'lexicon_reject', 'lexicon_accept', 'passthrough')
+
+
+def compile_terms(terms):
+    # One alternation, longest phrases first, so the regex engine does a
+    # single pass over the text regardless of how many terms there are
+    if not terms:
+        return None
+    alternation = '|'.join(re.escape(term) for term in sorted(set(terms), key=len, reverse=True))
+    return re.compile(rf'(?<!\w)(?:{alternation})(?!\w)', re.IGNORECASE)
+
+
+class PreFilter:
+    """Cheap local moderation tier in front of the LLM.
+
+    classify() returns a verdict in moderate_content's shape when the text
+    is clearly fine or clearly not, and None when the model should decide.
+    Clear rejections come from the blocked-term automaton, or a watched term
+    combined with a strongly negative VADER score. Clear accepts need no
+    watched terms, a short text and a clearly positive VADER score. VADER
+    measures sentiment, not toxicity: neutral harassment, scams or doxxing
+    score around 0, so anything short of warm goes to the model. Without
+    the VADER lexicon only the keyword tier runs.
+    """
+
+    def __init__(self, app=None, analyzer=None):
+        self.enabled = True
+        self.blocked = compile_terms(BLOCKED_TERMS)
+        self.watched = compile_terms(WATCH_TERMS)
+        self.accept_threshold = 0.5
+        self.reject_threshold = -0.75
+        self.max_accept_length = 280
+        self._analyzer = analyzer
+        self._analyzer_loaded = analyzer is not None
+        self._lock = threading.Lock()
+        self._stats = {tier: {'count': 0, 'seconds': 0.0} for tier in TIERS}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PREFILTER_ENABLED', True)
+        app.config.setdefault('PREFILTER_BLOCKED_TERMS', BLOCKED_TERMS)
+        app.config.setdefault('PREFILTER_WATCH_TERMS', WATCH_TERMS)
+        app.config.setdefault('PREFILTER_ACCEPT_THRESHOLD', 0.5)
+        app.config.setdefault('PREFILTER_REJECT_THRESHOLD', -0.75)
+        app.config.setdefault('PREFILTER_MAX_ACCEPT_LENGTH', 280)
+        self.enabled = app.config['PREFILTER_ENABLED']
+        self.blocked = compile_terms(app.config['PREFILTER_BLOCKED_TERMS'])
+        self.watched = compile_terms(app.config['PREFILTER_WATCH_TERMS'])
+        self.accept_threshold = app.config['PREFILTER_ACCEPT_THRESHOLD']
+        self.reject_threshold = app.config['PREFILTER_REJECT_THRESHOLD']
+        self.max_accept_length = app.config['PREFILTER_MAX_ACCEPT_LENGTH']
+        app.extensions['moderation_prefilter'] = self
+
+    def _get_analyzer(self):
+        if not self._analyzer_loaded:
+            with self._lock:
+                if not self._analyzer_loaded:
+                    try:
+                        from nltk.sentiment.vader import SentimentIntensityAnalyzer
+                        self._analyzer = SentimentIntensityAnalyzer()
+                    except LookupError:
+                        logger.warning("VADER lexicon not installed; the pre-filter will only use keywords. "
+                                       "Run: python -m nltk.downloader vader_lexicon")
+                        self._analyzer = None
+                    self._analyzer_loaded = True
+        return self._analyzer
+
+    def _record(self, tier, started):
+        with self._lock:
+            self._stats[tier]['count'] += 1
+            self._stats[tier]['seconds'] += time.perf_counter() - started
+
+    def classify(self, text):
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+
+        blocked = self.blocked.findall(text) if self.blocked else []
+        if blocked:
+            self._record('keyword_reject', started)
+            return rejection(blocked)
+
+        watched = self.watched.findall(text) if self.watched else []
+        analyzer = self._get_analyzer()
+        if analyzer is None:
+            self._record('passthrough', started)
+            return None
+
+        compound = analyzer.polarity_scores(text)['compound']
+        if watched and compound <= self.reject_threshold:
+            self._record('lexicon_reject', started)
+            return rejection(watched)
+        if not watched and compound >= self.accept_threshold and len(text) <= self.max_accept_length:
+            self._record('lexicon_accept', started)
+            return acceptance(compound)
+
+        self._record('passthrough', started)
+        return None
+
+    def stats(self):
+        with self._lock:
+            stats = {tier: dict(values) for tier, values in self._stats.items()}
+        total = sum(values['count'] for values in stats.values())
+        decided = total - stats['passthrough']['count']
+        stats['total'] = total
+        stats['short_circuit_rate'] = decided / total if total else 0.0
+        return stats
+
+
+def rejection(terms):
+    found = ', '.join(sorted({term.lower() for term in terms}))
+    return {
+        'violates_guidelines': True,
+        'explanation': f"This post contains language that goes against our community guidelines ({found}).",
+        'sentiment': 'negative',
+        'suggestions': [f"Try rewording without \"{term}\"." for term in sorted({term.lower() for term in terms})]
+    }
+
+
+def acceptance(compound):
+    return {
+        'violates_guidelines': False,
+        'explanation': "No community guideline concerns found.",
+        'sentiment': 'positive' if compound >= 0.05 else 'neutral',
+        'suggestions': []
+    }
+
+
+prefilter = PreFilter()
@@ -1,23 +1,17 @@
 
-from flask import Blueprint, jsonify, render_template, request, redirect, url_for, flash
+from flask import Blueprint, abort, jsonify, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-from models import Comment, Follow, User, Like, Message, Notification, Post, db
-from datetime import datetime
-import os
-import google.generativeai as genai
-from dotenv import load_dotenv
-from cache_utils import cache
+from models import Comment, User, Like, Message, Notification, Post, db
+from likes import add_like, remove_like
+from media import save_upload
+from notifications import notify
+from follows import follow_user, is_following, is_following_many, unfollow_user
+from profile_cache import profile_cache
+from write_behind import write_behind
 
 
-load_dotenv()
-
 profile = Blueprint('prof', __name__)
 
-# Configure Gemini AI
-genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-model = genai.GenerativeModel('gemini-pro')
-
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 def allowed_file(filename):
@@ -25,24 +19,22 @@ def allowed_file(filename):
 
 @profile.route('/profile/<username>')
 @login_required
-@cache.cached(timeout=300)
 def user_profile(username):
-    user = User.query.filter_by(username=username).first_or_404()
-    posts = Post.query.filter_by(author=user).order_by(Post.timestamp.desc()).all()
-    followers_count = user.followers.count()
-    following_count = user.followed.count()
-    posts_count = user.posts.count()
-    timestamp = datetime.now().timestamp()
+    # Shared data comes from the profile cache; only the follow state is per viewer
+    data = profile_cache.get_profile(username)
+    if data is None:
+        abort(404)
+    user = data['user']
 
     return render_template(
         'profile.html',
         user=user,
         current_user=current_user,
-        posts=posts,
-        followers_count=followers_count,
-        following_count=following_count,
-        posts_count=posts_count,
-        timestamp=timestamp
+        posts=data['posts'],
+        followers_count=data['followers_count'],
+        following_count=data['following_count'],
+        posts_count=data['posts_count'],
+        viewer_follows=user['id'] != current_user.id and is_following(current_user.id, user['id'])
     )
 
 
@@ -50,6 +42,7 @@ def user_profile(username):
 @login_required
 def edit_profile():
     if request.method == 'POST':
+        old_username = current_user.username
         username = request.form.get('username')
         email = request.form.get('email')
         bio = request.form.get('bio')
@@ -67,11 +60,10 @@ def edit_profile():
         if 'profile_picture' in request.files:
             file = request.files['profile_picture']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file.save(os.path.join('static/uploads', filename))
-                current_user.profile_picture = filename
+                current_user.profile_picture = save_upload(file)
 
         db.session.commit()
+        profile_cache.invalidate(old_username, current_user.username)
         flash('Your profile has been updated.', 'success')
         return redirect(url_for('prof.user_profile', username=current_user.username))
 
@@ -81,33 +73,38 @@ def edit_profile():
 @login_required
 def follow(username):
     user = User.query.filter_by(username=username).first_or_404()
-    current_user.follow(user)
-    db.session.commit()
+    if follow_user(current_user.id, user.id):
+        db.session.commit()
+        profile_cache.invalidate(current_user.username, user.username)
+        notify(user.id, 'follow', current_user.id)
     return redirect(url_for('prof.user_profile', username=username))
 
 @profile.route('/unfollow/<username>', methods=['POST'])
 @login_required
 def unfollow(username):
     user = User.query.filter_by(username=username).first_or_404()
-    current_user.unfollow(user)
-    db.session.commit()
+    if unfollow_user(current_user.id, user.id):
+        db.session.commit()
+        profile_cache.invalidate(current_user.username, user.username)
     return redirect(url_for('prof.user_profile', username=username))
 
 @profile.route('/followers/<username>')
 @login_required
-@cache.cached(timeout=300, key_prefix='followers_%s')
 def followers(username):
-    user = User.query.filter_by(username=username).first_or_404()
-    followers = user.followers.all()
-    return render_template('followers.html', user=user, followers=followers)
+    data = profile_cache.get_followers(username)
+    if data is None:
+        abort(404)
+    viewer_follows = is_following_many(current_user.id, [other['id'] for other in data['users']])
+    return render_template('followers.html', user=data['user'], followers=data['users'], viewer_follows=viewer_follows)
 
 @profile.route('/following/<username>')
 @login_required
-@cache.cached(timeout=300, key_prefix='following_%s')
 def following(username):
-    user = User.query.filter_by(username=username).first_or_404()
-    following = user.following.all()
-    return render_template('following.html', user=user, following=following)
+    data = profile_cache.get_following(username)
+    if data is None:
+        abort(404)
+    viewer_follows = is_following_many(current_user.id, [other['id'] for other in data['users']])
+    return render_template('following.html', user=data['user'], following=data['users'], viewer_follows=viewer_follows)
 
 
 
@@ -115,18 +112,15 @@ def following(username):
 @login_required
 def like_post(post_id):
     post = Post.query.get_or_404(post_id)
-    if current_user not in post.likes:
-        post.likes.append(current_user)
-        db.session.commit()
+    if write_behind.run(add_like, post_id, current_user.id):
+        notify(post.user_id, 'like', current_user.id, post.id)
     return redirect(request.referrer)
 
 @profile.route('/post/<int:post_id>/unlike', methods=['POST'])
 @login_required
 def unlike_post(post_id):
-    post = Post.query.get_or_404(post_id)
-    if current_user in post.likes:
-        post.likes.remove(current_user)
-        db.session.commit()
+    Post.query.get_or_404(post_id)
+    write_behind.run(remove_like, post_id, current_user.id)
     return redirect(request.referrer)
 
 
@@ -0,0 +1,108 @@
+import threading
+
+from cache_utils import cache, get_or_set
+from models import Post, User
+from moderation import POST_PUBLISHED
+
+NAMESPACES = ('profile', 'followers', 'following')
+
+
+class ProfileCache:
+    """Viewer-independent profile data under explicit per-username keys.
+
+    Only what every viewer sees the same way is cached: the user's public
+    fields, counts and published posts, and the follower/following lists.
+    Viewer-specific state such as the follow button is looked up per request.
+    Entries are dropped on follow/unfollow, profile edits and when a post is
+    published or deleted; like and comment counts on cached posts can lag by
+    up to PROFILE_CACHE_TIMEOUT seconds.
+    """
+
+    def __init__(self, app=None):
+        self.timeout = 300
+        self._lock = threading.Lock()
+        self._stats = {namespace: {'hits': 0, 'misses': 0} for namespace in NAMESPACES}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILE_CACHE_TIMEOUT', 300)
+        self.timeout = app.config['PROFILE_CACHE_TIMEOUT']
+        app.extensions['profile_cache'] = self
+
+    def _get_or_build(self, namespace, username, build):
+        built = []
+
+        def build_once():
+            built.append(True)
+            return build(username)
+
+        value = get_or_set(f"{namespace}:{username}", build_once, timeout=self.timeout)
+        with self._lock:
+            self._stats[namespace]['misses' if built else 'hits'] += 1
+        return value
+
+    def get_profile(self, username):
+        """Return the shared profile data for username, or None if there is no such user."""
+        return self._get_or_build('profile', username, build_profile)
+
+    def get_followers(self, username):
+        return self._get_or_build('followers', username, lambda name: build_follow_list(name, 'followers'))
+
+    def get_following(self, username):
+        return self._get_or_build('following', username, lambda name: build_follow_list(name, 'following'))
+
+    def invalidate(self, *usernames):
+        cache.delete_many(*[f"{namespace}:{username}" for username in usernames for namespace in NAMESPACES])
+
+    def stats(self):
+        with self._lock:
+            stats = {namespace: dict(counts) for namespace, counts in self._stats.items()}
+        for counts in stats.values():
+            lookups = counts['hits'] + counts['misses']
+            counts['hit_rate'] = counts['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+def serialize_profile_user(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'bio': user.bio,
+        'profile_picture': user.profile_picture,
+        'date_joined': user.date_joined
+    }
+
+
+def build_profile(username):
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        return None
+    posts = Post.query.filter_by(user_id=user.id, status=POST_PUBLISHED).order_by(Post.timestamp.desc()).all()
+    return {
+        'user': serialize_profile_user(user),
+        'posts': [{
+            'id': post.id,
+            'content': post.content,
+            'content_html': post.content_html,
+            'media_url': post.media_url,
+            'timestamp': post.timestamp,
+            'like_count': post.like_count,
+            'comment_count': post.comment_count
+        } for post in posts],
+        'posts_count': len(posts),
+        'followers_count': user.followers_count,
+        'following_count': user.following_count
+    }
+
+
+def build_follow_list(username, kind):
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        return None
+    users = user.followers if kind == 'followers' else user.followed
+    return {'user': serialize_profile_user(user), 'users': [serialize_profile_user(other) for other in users]}
+
+
+profile_cache = ProfileCache()
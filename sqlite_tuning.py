@@ -0,0 +1,91 @@
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+# Config key -> pragma, applied to every new SQLite connection
+PRAGMA_SETTINGS = {
+    'SQLITE_JOURNAL_MODE': 'journal_mode',
+    'SQLITE_SYNCHRONOUS': 'synchronous',
+    'SQLITE_BUSY_TIMEOUT_MS': 'busy_timeout',
+    'SQLITE_CACHE_SIZE': 'cache_size',
+    'SQLITE_MMAP_SIZE': 'mmap_size',
+}
+
+DEFAULTS = {
+    # Readers no longer block the writer (or each other) under WAL
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    # Safe with WAL: a power loss can drop the last commits but not corrupt the file
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    # Wait for the write lock instead of failing with "database is locked"
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+    # Negative sizes are KiB: 16MB of page cache per connection
+    'SQLITE_CACHE_SIZE': -16000,
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+    # One connection per request thread; SQLite has a single writer, so a
+    # bigger pool only queues more writers on the lock
+    'SQLITE_POOL_SIZE': 10,
+    'SQLITE_MAX_OVERFLOW': 10,
+    'SQLITE_POOL_TIMEOUT': 10,
+}
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+class SQLiteTuning:
+    """Production settings for the app's SQLite database.
+
+    Call init_app() before db.init_app(): it sizes the connection pool
+    through SQLALCHEMY_ENGINE_OPTIONS (which the engine is built from) and
+    registers a connect listener that sets WAL, synchronous, busy_timeout,
+    cache_size and mmap_size on every pooled connection. Each setting is an
+    SQLITE_* config key; anything already in SQLALCHEMY_ENGINE_OPTIONS wins.
+    Non-SQLite database URIs are left alone.
+    """
+
+    def __init__(self, app=None):
+        self.pragmas = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        app.extensions['sqlite_tuning'] = self
+
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI')
+        url = make_url(uri) if uri else None
+        if url is None or url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+            return
+
+        self.pragmas = {pragma: app.config[key] for key, pragma in PRAGMA_SETTINGS.items()}
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        options.setdefault('pool_size', app.config['SQLITE_POOL_SIZE'])
+        options.setdefault('max_overflow', app.config['SQLITE_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', app.config['SQLITE_POOL_TIMEOUT'])
+        # The driver's own lock wait, in seconds, matches busy_timeout
+        options.setdefault('connect_args', {}).setdefault('timeout', app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000.0)
+
+        if not event.contains(Engine, 'connect', self._on_connect):
+            event.listen(Engine, 'connect', self._on_connect)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            apply_pragmas(dbapi_connection, self.pragmas)
+
+    def settings(self, connection):
+        """Return the pragmas as SQLite reports them on `connection` (a SQLAlchemy connection)."""
+        return {
+            name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+            for name in PRAGMA_SETTINGS.values()
+        }
+
+
+sqlite_tuning = SQLiteTuning()
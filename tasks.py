@@ -1,15 +1,227 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
 
+from models import Notification, db
 
+logger = logging.getLogger(__name__)
 
-from models import Notification, db
+
+class Task:
+    def __init__(self, queue, func, name, batch):
+        self.queue = queue
+        self.func = func
+        self.name = name
+        self.batch = batch
+
+    def __call__(self, *args):
+        if self.batch:
+            return self.func([list(args)])
+        return self.func(*args)
+
+    def delay(self, *args):
+        return self.queue.enqueue(self.name, args)
+
+
+class TaskQueue:
+    """Durable background jobs in a SQLite file, run by worker threads.
+
+    task.delay(*args) appends a row; any worker thread in any process using
+    the same file can claim it. A claim leases the job for
+    TASK_LEASE_SECONDS, so jobs from a worker that died are picked up again,
+    and failed jobs are retried with backoff up to TASK_MAX_ATTEMPTS times.
+    Tasks registered with batch=True are called once per claimed batch with
+    a list of argument lists, which lets them write a whole batch in one
+    statement; woken workers wait TASK_BATCH_WAIT_MS for a batch to form.
+    Arguments must be JSON-serializable.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.path = None
+        self.tasks = {}
+        self.batch_size = 100
+        self.batch_wait = 0.05
+        self.lease = 60
+        self.max_attempts = 5
+        self.poll_interval = 0.5
+        self.num_workers = 2
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._workers = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TASK_QUEUE_PATH', os.path.join(app.instance_path, 'tasks.db'))
+        app.config.setdefault('TASK_WORKERS', 2)
+        app.config.setdefault('TASK_BATCH_SIZE', 100)
+        app.config.setdefault('TASK_BATCH_WAIT_MS', 50)
+        app.config.setdefault('TASK_LEASE_SECONDS', 60)
+        app.config.setdefault('TASK_MAX_ATTEMPTS', 5)
+        app.config.setdefault('TASK_POLL_INTERVAL', 0.5)
+        self.app = app
+        self.path = app.config['TASK_QUEUE_PATH']
+        self.num_workers = app.config['TASK_WORKERS']
+        self.batch_size = app.config['TASK_BATCH_SIZE']
+        self.batch_wait = app.config['TASK_BATCH_WAIT_MS'] / 1000.0
+        self.lease = app.config['TASK_LEASE_SECONDS']
+        self.max_attempts = app.config['TASK_MAX_ATTEMPTS']
+        self.poll_interval = app.config['TASK_POLL_INTERVAL']
+        self._local = threading.local()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, args TEXT NOT NULL, '
+                'attempts INTEGER NOT NULL DEFAULT 0, available_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_jobs_available_at ON jobs (available_at, id)')
+        # Workers start with the first request, so jobs left over from a
+        # previous run are picked up without waiting for a new one
+        app.before_request(self.start)
+        app.extensions['task_queue'] = self
+
+    def task(self, batch=False):
+        def decorator(func):
+            name = f"{func.__module__}.{func.__name__}"
+            self.tasks[name] = Task(self, func, name, batch)
+            return self.tasks[name]
+        return decorator
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, name, args):
+        cursor = self._connect().execute(
+            'INSERT INTO jobs (name, args, available_at) VALUES (?, ?, ?)',
+            (name, json.dumps(list(args)), time.time())
+        )
+        self.start()
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def start(self):
+        if len(self._workers) < self.num_workers:
+            with self._lock:
+                while len(self._workers) < self.num_workers:
+                    worker = threading.Thread(target=self._work, name=f'tasks-{len(self._workers)}', daemon=True)
+                    worker.start()
+                    self._workers.append(worker)
+
+    def pending(self):
+        return self._connect().execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+    def _claim(self):
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            jobs = conn.execute(
+                'SELECT id, name, args, attempts FROM jobs WHERE available_at <= ? ORDER BY id LIMIT ?',
+                (now, self.batch_size)
+            ).fetchall()
+            if jobs:
+                conn.executemany(
+                    'UPDATE jobs SET available_at = ?, attempts = attempts + 1 WHERE id = ?',
+                    [(now + self.lease, job[0]) for job in jobs]
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return jobs
+
+    def _work(self):
+        while True:
+            try:
+                jobs = self._claim()
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Could not claim background jobs: {str(e)}")
+                jobs = []
+            if not jobs:
+                if self._wakeup.wait(self.poll_interval):
+                    self._wakeup.clear()
+                    time.sleep(self.batch_wait)
+                continue
+
+            by_name = defaultdict(list)
+            for job_id, name, args, attempts in jobs:
+                by_name[name].append((job_id, json.loads(args), attempts + 1))
+            with self.app.app_context():
+                for name, named_jobs in by_name.items():
+                    self._run(name, named_jobs)
+
+    def _run(self, name, jobs):
+        task = self.tasks.get(name)
+        if task is None:
+            logger.error(f"No task registered as {name}; dropping {len(jobs)} jobs")
+            self._finish([job_id for job_id, _, _ in jobs])
+            return
+
+        if task.batch:
+            self._run_group(name, task, jobs)
+        else:
+            for job in jobs:
+                self._run_group(name, task, [job])
+
+    def _run_group(self, name, task, group):
+        try:
+            if task.batch:
+                task.func([args for _, args, _ in group])
+            else:
+                task.func(*group[0][1])
+        except Exception as e:
+            db.session.rollback()
+            if len(group) > 1:
+                # One bad payload must not hold back the rest of the batch:
+                # replay it job by job so only the failing ones are retried
+                logger.warning(f"Task {name} failed for a batch of {len(group)} jobs ({str(e)}); running them one by one")
+                db.session.remove()
+                for job in group:
+                    self._run_group(name, task, [job])
+                return
+            logger.error(f"Task {name} failed for job {group[0][0]}: {str(e)}", exc_info=True)
+            self._retry(name, group)
+        else:
+            self._finish([job_id for job_id, _, _ in group])
+        finally:
+            db.session.remove()
+
+    def _finish(self, job_ids):
+        self._connect().executemany('DELETE FROM jobs WHERE id = ?', [(job_id,) for job_id in job_ids])
+
+    def _retry(self, name, jobs):
+        now = time.time()
+        conn = self._connect()
+        for job_id, args, attempts in jobs:
+            if attempts >= self.max_attempts:
+                logger.error(f"Giving up on job {job_id} after {attempts} attempts; dropped {name}{tuple(args)}")
+                conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+            else:
+                conn.execute('UPDATE jobs SET available_at = ? WHERE id = ?', (now + 2 ** attempts, job_id))
 
 
+task_queue = TaskQueue()
 
 
+@task_queue.task()
 def create_notification(user_id, content):
     new_notification = Notification(user_id=user_id, content=content)
     db.session.add(new_notification)
     db.session.commit()
-    
-    
-    
@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the tests' database, cache and queues out of the real instance folder
+os.environ.setdefault('INSTANCE_PATH', tempfile.mkdtemp(prefix='social-media-tests-'))
+os.environ.setdefault('MODERATION_CLIENT', 'fake')
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import app as flask_app  # noqa: E402
+from cache_utils import cache  # noqa: E402
+from models import User, db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        db.create_all()
+        cache.clear()
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def make_user(app):
+    def make(username):
+        with app.app_context():
+            user = User(username=username, email=f'{username}@example.com',
+                        password_hash=generate_password_hash('password'))
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+
+@pytest.fixture
+def login(app):
+    def log_in(username):
+        client = app.test_client()
+        response = client.post('/login', data={'username': username, 'password': 'password'})
+        assert response.status_code == 302
+        return client
+    return log_in
@@ -0,0 +1,33 @@
+from counters import find_counter_drift
+from models import Comment, Post, db
+
+
+def test_deleting_an_account_leaves_no_counter_drift(app, make_user, login):
+    alice_id = make_user('alice')
+    bob_id = make_user('bob')
+    with app.app_context():
+        post = Post(content='hello', user_id=alice_id)
+        db.session.add(post)
+        db.session.commit()
+        post_id = post.id
+
+    bob = login('bob')
+    assert bob.post(f'/comment/{post_id}', json={'content': 'nice'}).status_code == 201
+    assert bob.post(f'/comment/{post_id}', json={'content': 'again'}).status_code == 201
+    assert bob.post(f'/like/{post_id}').status_code == 200
+    # A comment from alice on bob's post goes with the post
+    with app.app_context():
+        bobs_post = Post(content='mine', user_id=bob_id)
+        db.session.add(bobs_post)
+        db.session.commit()
+        bobs_post_id = bobs_post.id
+    alice = login('alice')
+    assert alice.post(f'/comment/{bobs_post_id}', json={'content': 'hi bob'}).status_code == 201
+
+    assert bob.post('/api/delete_account').status_code == 200
+
+    with app.app_context():
+        assert find_counter_drift() == []
+        post = db.session.get(Post, post_id)
+        assert (post.like_count, post.comment_count) == (0, 0)
+        assert Comment.query.count() == 0
@@ -0,0 +1,45 @@
+import time
+from datetime import datetime, timedelta
+
+from models import Post, db
+from moderation import POST_PENDING, POST_PUBLISHED
+
+
+class FailingClient:
+    def generate(self, prompt):
+        raise ConnectionError('model unavailable')
+
+
+def wait_for_status(app, post_id, status, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with app.app_context():
+            if db.session.get(Post, post_id).status == status:
+                return True
+        time.sleep(0.05)
+    return False
+
+
+def test_model_errors_leave_the_post_pending_until_the_sweeper_retries(app, make_user):
+    author_id = make_user('alice')
+    with app.app_context():
+        post = Post(content='What a lovely sunny day', user_id=author_id, status=POST_PENDING,
+                    timestamp=datetime.utcnow() - timedelta(hours=1))
+        db.session.add(post)
+        db.session.commit()
+        post_id = post.id
+
+    pipeline = app.extensions['moderation_pipeline']
+    client = pipeline.client
+    pipeline.set_client(FailingClient())
+    try:
+        assert pipeline.submit(post_id, author_id, 'What a lovely sunny day').result(timeout=10) is None
+    finally:
+        pipeline.set_client(client)
+    with app.app_context():
+        assert db.session.get(Post, post_id).status == POST_PENDING
+
+    # The model is back: the sweep picks the post up again and publishes it
+    with app.app_context():
+        pipeline.recover_stalled()
+    assert wait_for_status(app, post_id, POST_PUBLISHED)
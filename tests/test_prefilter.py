@@ -0,0 +1,28 @@
+from prefilter import PreFilter
+
+
+class StubAnalyzer:
+    """Stands in for VADER with a fixed compound score."""
+
+    def __init__(self, compound):
+        self.compound = compound
+
+    def polarity_scores(self, text):
+        return {'compound': self.compound}
+
+
+def test_neutral_unlisted_abuse_goes_to_the_model():
+    # No blocked or watched term, and VADER reads it as neutral
+    prefilter = PreFilter(analyzer=StubAnalyzer(0.0))
+    assert prefilter.classify('I know where you live, 14 Elm Street. See you tonight.') is None
+
+
+def test_clearly_positive_short_text_is_accepted_locally():
+    prefilter = PreFilter(analyzer=StubAnalyzer(0.8))
+    verdict = prefilter.classify('What a wonderful day with friends!')
+    assert verdict['violates_guidelines'] is False
+
+
+def test_blocked_terms_are_rejected_without_the_analyzer():
+    prefilter = PreFilter(analyzer=StubAnalyzer(0.9))
+    assert prefilter.classify('just kys')['violates_guidelines'] is True
@@ -0,0 +1,19 @@
+from mentions import link_mentions
+from models import Post, db
+
+
+def test_profile_page_and_mention_links(app, make_user, login):
+    alice_id = make_user('alice')
+    make_user('bob')
+    with app.test_request_context():
+        content_html = link_mentions('hi @bob')
+    assert 'href="/profile/bob"' in content_html
+    with app.app_context():
+        db.session.add(Post(content='hi @bob', content_html=content_html, user_id=alice_id))
+        db.session.commit()
+
+    client = login('bob')
+    response = client.get('/profile/alice')
+    assert response.status_code == 200
+    assert b'href="/profile/bob"' in response.data
+    assert client.get('/').status_code == 200
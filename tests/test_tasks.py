@@ -0,0 +1,48 @@
+import json
+import time
+
+from models import Notification, db
+from notifications import deliver_notifications
+from tasks import task_queue
+
+
+def add_jobs(name, calls, attempts=0):
+    # Parked far in the future so the queue's own workers leave them alone
+    conn = task_queue._connect()
+    job_ids = [
+        conn.execute('INSERT INTO jobs (name, args, attempts, available_at) VALUES (?, ?, ?, ?)',
+                     (name, json.dumps(list(args)), attempts, time.time() + 3600)).lastrowid
+        for args in calls
+    ]
+    return [(job_id, list(args), attempts + 1) for job_id, args in zip(job_ids, calls)]
+
+
+def remaining(job_ids):
+    conn = task_queue._connect()
+    return [job_id for job_id in job_ids if conn.execute('SELECT 1 FROM jobs WHERE id = ?', (job_id,)).fetchone()]
+
+
+def test_a_poison_job_does_not_take_its_batch_down(app, make_user):
+    alice_id, bob_id, carol_id = make_user('alice'), make_user('bob'), make_user('carol')
+    healthy = [(alice_id, 'follow', bob_id, None), (bob_id, 'follow', carol_id, None)]
+    poison = (carol_id, 'no-such-kind', alice_id, None)
+    jobs = add_jobs(deliver_notifications.name, [healthy[0], poison, healthy[1]])
+
+    with app.app_context():
+        task_queue._run(deliver_notifications.name, jobs)
+        assert sorted(n.user_id for n in Notification.query) == [alice_id, bob_id]
+
+    # Only the poison job is kept for a retry
+    assert remaining([job_id for job_id, _, _ in jobs]) == [jobs[1][0]]
+
+
+def test_a_poison_job_out_of_attempts_is_dropped_alone(app, make_user):
+    alice_id, bob_id = make_user('alice'), make_user('bob')
+    jobs = add_jobs(deliver_notifications.name, [
+        (alice_id, 'follow', bob_id, None), (bob_id, 'no-such-kind', alice_id, None)
+    ], attempts=task_queue.max_attempts - 1)
+
+    with app.app_context():
+        task_queue._run(deliver_notifications.name, jobs)
+        assert [n.user_id for n in Notification.query] == [alice_id]
+    assert remaining([job_id for job_id, _, _ in jobs]) == []
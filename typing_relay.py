@@ -0,0 +1,95 @@
+import threading
+import time
+
+COUNTERS = ('typing_in', 'stop_typing_in', 'started_out', 'refreshed_out', 'stopped_out', 'expired_out')
+
+
+class TypingRelay:
+    """Debounces typing indicators per (sender, recipient) pair.
+
+    Clients may emit 'typing' on every keystroke; the recipient only gets a
+    'typing' event when the pair starts typing, plus a refresh once per half
+    TTL while it keeps going, so the indicator (which clients hide after
+    `ttl` seconds) stays up. 'stop_typing' goes out once, on an explicit
+    stop or when no typing event arrived for TYPING_TTL_SECONDS. State lives
+    in this worker's memory: a sender's events all arrive on their own
+    connection, so the same worker always sees a pair.
+    """
+
+    def __init__(self, app=None, socketio=None):
+        self.socketio = None
+        self.ttl = 5.0
+        self._active = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._counts = dict.fromkeys(COUNTERS, 0)
+        if app is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        app.config.setdefault('TYPING_TTL_SECONDS', 5.0)
+        self.socketio = socketio
+        self.ttl = app.config['TYPING_TTL_SECONDS']
+        app.extensions['typing_relay'] = self
+
+    def typing(self, sender_id, recipient_id):
+        now = time.monotonic()
+        key = (sender_id, recipient_id)
+        with self._lock:
+            self._counts['typing_in'] += 1
+            state = self._active.get(key)
+            if state is None:
+                event = 'started_out'
+            elif now - state['announced_at'] >= self.ttl / 2:
+                event = 'refreshed_out'
+            else:
+                event = None
+            if event is None:
+                state['expires_at'] = now + self.ttl
+                return
+            self._active[key] = {'announced_at': now, 'expires_at': now + self.ttl}
+            self._counts[event] += 1
+        self._ensure_sweeper()
+        self.socketio.emit('typing', {'sender_id': sender_id, 'ttl': self.ttl}, room=str(recipient_id))
+
+    def stop_typing(self, sender_id, recipient_id):
+        with self._lock:
+            self._counts['stop_typing_in'] += 1
+            if self._active.pop((sender_id, recipient_id), None) is None:
+                return
+            self._counts['stopped_out'] += 1
+        self.socketio.emit('stop_typing', {'sender_id': sender_id}, room=str(recipient_id))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            stats['active_pairs'] = len(self._active)
+        events_in = stats['typing_in'] + stats['stop_typing_in']
+        events_out = stats['started_out'] + stats['refreshed_out'] + stats['stopped_out'] + stats['expired_out']
+        stats['events_in'] = events_in
+        stats['events_out'] = events_out
+        stats['suppression_rate'] = 1 - events_out / events_in if events_in else 0.0
+        return stats
+
+    def _ensure_sweeper(self):
+        if self._sweeper is None:
+            with self._lock:
+                if self._sweeper is None:
+                    self._sweeper = threading.Thread(target=self._sweep, name='typing-expiry', daemon=True)
+                    self._sweeper.start()
+
+    def _sweep(self):
+        interval = max(self.ttl / 10, 0.05)
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            with self._lock:
+                expired = [key for key, state in self._active.items() if state['expires_at'] <= now]
+                for key in expired:
+                    del self._active[key]
+                self._counts['expired_out'] += len(expired)
+            for sender_id, recipient_id in expired:
+                self.socketio.emit('stop_typing', {'sender_id': sender_id}, room=str(recipient_id))
+
+
+typing_relay = TypingRelay()
@@ -0,0 +1,171 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindTimeout(Exception):
+    """A queued write waited past WRITE_BEHIND_TIMEOUT and was withdrawn; it was not applied."""
+
+
+class WriteBehind:
+    """Coalesces small writes from many requests into one transaction.
+
+    submit(func, *args) returns a Future. With WRITE_BEHIND_ENABLED, calls
+    are queued and a flusher thread runs everything that arrived within
+    WRITE_BEHIND_FLUSH_MS (up to WRITE_BEHIND_MAX_BATCH calls) in one
+    session and commits once, so a burst of likes costs one fsync instead of
+    one each. Each caller's future then resolves with its own func's return
+    value. If the batch fails to commit it is rolled back and replayed one
+    call per transaction, so only the failing call sees its exception.
+
+    Disabled (the default), submit() runs func and commits in the caller's
+    session and hands back a resolved future, so callers are written the
+    same way in both modes; in both, the caller's session is committed.
+    func runs without a request context: pass ids, not current_user, and
+    return plain values rather than ORM objects.
+
+    run() waits up to WRITE_BEHIND_TIMEOUT. A call still queued by then is
+    cancelled and WriteBehindTimeout raised, so it never lands; one already
+    in a flushing batch is waited for, so its caller sees what happened.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.flush_interval = 0.005
+        self.max_batch = 256
+        self.timeout = 10.0
+        self._queue = queue.Queue()
+        self._flusher = None
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'batches': 0, 'replayed_batches': 0, 'failed_calls': 0, 'timed_out_calls': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('WRITE_BEHIND_ENABLED', False)
+        app.config.setdefault('WRITE_BEHIND_FLUSH_MS', 5)
+        app.config.setdefault('WRITE_BEHIND_MAX_BATCH', 256)
+        app.config.setdefault('WRITE_BEHIND_TIMEOUT', 10.0)
+        self.app = app
+        self.enabled = app.config['WRITE_BEHIND_ENABLED']
+        self.flush_interval = app.config['WRITE_BEHIND_FLUSH_MS'] / 1000.0
+        self.max_batch = app.config['WRITE_BEHIND_MAX_BATCH']
+        self.timeout = app.config['WRITE_BEHIND_TIMEOUT']
+        app.extensions['write_behind'] = self
+
+    def submit(self, func, *args):
+        future = Future()
+        if not self.enabled:
+            try:
+                result = func(*args)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            return future
+
+        # Commit whatever the caller has so far, as the inline path would, and
+        # hand its pooled connection back: a request waiting on the future
+        # must not hold one the flusher needs
+        db.session.commit()
+        self._ensure_flusher()
+        self._queue.put((func, args, future))
+        return future
+
+    def run(self, func, *args):
+        """submit() and wait for the result, raising whatever func raised."""
+        future = self.submit(func, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            if future.cancel():
+                with self._lock:
+                    self._stats['timed_out_calls'] += 1
+                raise WriteBehindTimeout(f"write not flushed within {self.timeout}s")
+            # Already being written: the outcome is moments away
+            return future.result()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['enabled'] = self.enabled
+        stats['mean_batch_size'] = stats['calls'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            with self._lock:
+                if self._flusher is None or not self._flusher.is_alive():
+                    self._flusher = threading.Thread(target=self._collect, name='write-behind', daemon=True)
+                    self._flusher.start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                with self.app.app_context():
+                    try:
+                        self._flush(batch)
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                # Keep the flusher alive; fail whatever this batch left unresolved
+                logger.error(f"Write-behind flush failed: {str(e)}", exc_info=True)
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _flush(self, batch):
+        # Calls whose callers gave up (see run()) are dropped; the rest can no longer be cancelled
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        with self._lock:
+            self._stats['calls'] += len(batch)
+            self._stats['batches'] += 1
+        try:
+            results = [func(*args) for func, args, _ in batch]
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Write-behind batch of {len(batch)} failed ({str(e)}); replaying one by one")
+            with self._lock:
+                self._stats['replayed_batches'] += 1
+            self._replay(batch)
+            return
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _replay(self, batch):
+        for func, args, future in batch:
+            try:
+                result = func(*args)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                with self._lock:
+                    self._stats['failed_calls'] += 1
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+
+write_behind = WriteBehind()